@@ -1,58 +1,528 @@
 from sudoku_csp import SudokuCSP
+from csp import INFERENCE_NONE, INFERENCE_FORWARD_CHECK, INFERENCE_AC3, TRAIL_PRUNE
 from variable import Variable
 from sudoku_grid import SudokuGrid
+from collections import OrderedDict
+from bisect import bisect_right
+import time
+
+#Status of a finished search
+STATUS_SOLVED = 'solved'
+STATUS_UNSOLVED = 'unsolved' #the whole search space was explored without finding a solution
+STATUS_BUDGET_EXHAUSTED = 'budget-exhausted'
+STATUS_CANCELLED = 'cancelled'
+
+#The assignment cap the experiments in output-data were run with
+DEFAULT_MAX_ASSIGNMENTS = 10000
+
+
+class SearchBudget:
+    """Limits on a search. Contains:
+       1. maxAssignments - the search stops once more than this many assignments have been made
+       2. maxSeconds - the search stops once it has run for longer than this (wall-clock)
+       3. maxBacktracks - the search stops once more than this many choice points have run out of values
+       4. cancelEvent - optional shared event (e.g. threading.Event or multiprocessing.Event) that cancels the search
+          when set. cancel() does the same from the thread that owns the budget
+       Any limit can be None for no limit. The limits apply to each search the budget is passed to.
+    """
+
+    def __init__(self, maxAssignments=None, maxSeconds=None, maxBacktracks=None, cancelEvent=None):
+        self.maxAssignments = maxAssignments
+        self.maxSeconds = maxSeconds
+        self.maxBacktracks = maxBacktracks
+        self.cancelEvent = cancelEvent
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def isCancelled(self):
+        return self.cancelled or (self.cancelEvent != None and self.cancelEvent.is_set())
+
+    def getStopStatus(self, assignments, backtracks, elapsedSeconds):
+        """Returns the status the search has to stop with, or None if it can go on"""
+        if self.isCancelled():
+            return STATUS_CANCELLED
+        if (self.maxAssignments != None and assignments > self.maxAssignments) or \
+           (self.maxBacktracks != None and backtracks > self.maxBacktracks) or \
+           (self.maxSeconds != None and elapsedSeconds > self.maxSeconds):
+            return STATUS_BUDGET_EXHAUSTED
+        return None
+
+
+class SearchResult:
+    """Outcome of a search. Contains:
+       1. status - STATUS_SOLVED, STATUS_UNSOLVED, STATUS_BUDGET_EXHAUSTED or STATUS_CANCELLED
+       2. assignmentList - the values of all the variables when the search stopped (the solution when solved)
+       3. bestAssignmentList - the assignment with the most assigned variables reached by the search
+       4. assignments, backtracks - counts for this search only
+       5. elapsedSeconds - wall-clock time of the search
+    """
+
+    def __init__(self, status, assignmentList, bestAssignmentList, assignments, backtracks, elapsedSeconds):
+        self.status = status
+        self.assignmentList = assignmentList
+        self.bestAssignmentList = bestAssignmentList
+        self.assignments = assignments
+        self.backtracks = backtracks
+        self.elapsedSeconds = elapsedSeconds
+
+    def isSolved(self):
+        return self.status == STATUS_SOLVED
+
+
+class SearchStats:
+    """Opt-in statistics of a search, pass one to solve() or BacktrackSearch to collect them. Contains:
+       1. nodes - number of values tried, backtracks - number of choice points that ran out of values
+       2. prunings - domain values removed by the inferences, propagationCalls - calls to applyInferences
+       3. maxDepth - the deepest choice point stack reached, backjumps - dead ends that jumped over at least one
+          choice point, nogoodHits - values rejected by a learned nogood
+       4. times - seconds spent in selectUnassignedVariable, orderDomainValues, isConstraintsSatisfied and applyInferences
+       5. callback - optional function called as callback(event, variable, value, depth) for the events
+          'assign' (a value is tried), 'reject' (it failed the constraints or inferences), 'backtrack' and 'solution'
+    """
+
+    def __init__(self, callback=None):
+        self.nodes = 0
+        self.backtracks = 0
+        self.prunings = 0
+        self.propagationCalls = 0
+        self.maxDepth = 0
+        self.backjumps = 0
+        self.nogoodHits = 0
+        self.times = {name: 0.0 for name in ('selectUnassignedVariable', 'orderDomainValues', 'isConstraintsSatisfied', 'applyInferences')}
+        self.callback = callback
+
+    def timed(self, name, function):
+        """Returns function wrapped to add its running time to times[name]"""
+        times = self.times
+        def timedFunction(*args, **kwargs):
+            startTime = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                times[name] += time.perf_counter() - startTime
+        return timedFunction
+
+    def notify(self, event, variable, value, depth):
+        if self.callback != None:
+            self.callback(event, variable, value, depth)
+
+    def summary(self):
+        lines = ['nodes %d, backtracks %d, prunings %d, propagation calls %d, max depth %d, backjumps %d, nogood hits %d' %
+                 (self.nodes, self.backtracks, self.prunings, self.propagationCalls, self.maxDepth, self.backjumps, self.nogoodHits)]
+        for name in self.times:
+            lines.append('%-25s %.3fs' % (name, self.times[name]))
+        return '\n'.join(lines)
+
+
+class NogoodStore:
+    """Bounded store of learned nogoods: sets of (variable position, value) assignments that cannot all hold in a
+       solution. Contains:
+       1. nogoods - OrderedDict of the nogoods (frozensets), least recently used first
+       2. watches - the nogoods containing each (position, value) assignment
+       3. maxSize - the least recently used nogoods are dropped beyond this, maxLength - longer nogoods are not kept
+    """
+
+    def __init__(self, maxSize=1000, maxLength=12):
+        self.nogoods = OrderedDict()
+        self.watches = {}
+        self.maxSize = maxSize
+        self.maxLength = maxLength
+
+    def add(self, nogood):
+        nogood = frozenset(nogood)
+        if not nogood or len(nogood) > self.maxLength or nogood in self.nogoods:
+            return
+        self.nogoods[nogood] = None
+        for literal in nogood:
+            self.watches.setdefault(literal, set()).add(nogood)
+        while len(self.nogoods) > self.maxSize:
+            oldest, unused = self.nogoods.popitem(last=False)
+            for literal in oldest:
+                self.watches[literal].discard(oldest)
+
+    def getViolated(self, csp, index, value):
+        """Returns the other assignments of a nogood completed by assigning value to the variable at position index,
+           or None"""
+        literal = (index, value)
+        for nogood in self.watches.get(literal, ()):
+            if all(csp.variables[i].isAssigned and csp.variables[i].getValue() == v for (i, v) in nogood if i != index):
+                self.nogoods.move_to_end(nogood)
+                return [(i, v) for (i, v) in nogood if i != index]
+        return None
+
+
+def getRules(hiddenSingles=False, nakedSubsets=False, lockedCandidates=False):
+    """Names of the enabled propagation rules, in the order they are applied"""
+    return [rule for (rule, enabled) in (('hiddenSingles', hiddenSingles), ('nakedSubsets', nakedSubsets),
+                                         ('lockedCandidates', lockedCandidates)) if enabled]
+
+
+def startSearch(csp, budget=None, stats=None, forwardCheck=False, mrvHeuristic=False, maxDegreeHeuristic=False, lcvHeuristic=False,
+                inference=INFERENCE_NONE, hiddenSingles=False, nakedSubsets=False, lockedCandidates=False, backjumping=False, maxNogoods=0):
+    """Returns a BacktrackSearch of csp with the options of solve(), ready to run"""
+    rules = getRules(hiddenSingles, nakedSubsets, lockedCandidates)
+    search = BacktrackSearch(csp, forwardCheck=forwardCheck, mrvHeuristic=mrvHeuristic, maxDegreeHeuristic=maxDegreeHeuristic,
+                             lcvHeuristic=lcvHeuristic, inference=inference, rules=rules, budget=budget, stats=stats,
+                             backjumping=backjumping, maxNogoods=maxNogoods)
+    #Maintaining arc consistency and the propagation rules start from a propagated problem
+    if (inference == INFERENCE_AC3 and csp.propagateArcConsistency() == False) or \
+       (rules and csp.applyPropagationRules(rules) == False):
+        search.stop(STATUS_UNSOLVED)
+    return search
+
+
+def solve(csp, budget=None, stats=None, **options):
+    """Runs backtracking search on csp within budget (no limits when None) and returns a SearchResult. Statistics
+       are collected into stats when given. The options are the ones of backtrackSearch"""
+    search = startSearch(csp, budget=budget, stats=stats, **options)
+    search.run()
+    return search.getResult()
 
-def backtrackSearch(csp, forwardCheck=False, mrvHeuristic=False, maxDegreeHeuristic=False, lcvHeuristic=False):
-    initialAssignment = csp.getCurrentAssignment()
-    assignmentForVariables = []
-    backtrack(csp, forwardCheck=forwardCheck, mrvHeuristic=mrvHeuristic, maxDegreeHeuristic=maxDegreeHeuristic, lcvHeuristic=lcvHeuristic)
-    assignmentForVariables = csp.getCurrentAssignment().split(',')
-    return assignmentForVariables
-    
 
-def backtrack(csp, forwardCheck=False, mrvHeuristic=False, maxDegreeHeuristic=False, lcvHeuristic=False):
-    #Check if CSP is solved
-    if csp.isAssignmentComplete() == True:
-        return True
+def enumerateSolutions(csp, budget=None, stats=None, **options):
+    """Yields every solution of csp as a list of values. The search resumes from the choice point of the previous
+       solution, so the propagation above it is shared by all the solutions below"""
+    for solution in startSearch(csp, budget=budget, stats=stats, **options).iterSolutions():
+        yield solution
 
+
+def countSolutions(csp, limit=None, budget=None, **options):
+    """Counts the solutions of csp, stopping at limit. Returns (count, complete) where complete is true if the
+       whole search space was explored, so that count is exact"""
+    search = startSearch(csp, budget=budget, **options)
+    count = 0
+    for solution in search.iterSolutions():
+        count += 1
+        if limit != None and count >= limit:
+            return count, False
+    return count, search.status == STATUS_UNSOLVED
+
+
+def isUnique(csp, budget=None, **options):
+    """Returns true if csp has exactly one solution, false if it has none or several, or None if the budget ran
+       out first. The search stops at the second solution. Without options the search uses forward checking
+       and the MRV heuristic"""
+    if not options:
+        options = {'forwardCheck': True, 'mrvHeuristic': True}
+    count, complete = countSolutions(csp, limit=2, budget=budget, **options)
+    if count == 2:
+        return False
+    return count == 1 if complete else None
+
+
+def luby(i):
+    """Term i (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ... used as the restart schedule"""
+    while True:
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+def solveWithRestarts(csp, budget=None, stats=None, seed=None, restartBase=100, **options):
+    """solve() with randomized tie-breaking (seeded with seed) that restarts from the root after restartBase
+       times the next term of the Luby sequence of backtracks, so one unlucky early choice cannot use up the whole
+       budget. budget limits all the runs together. Returns a SearchResult with the totals of the runs"""
+    if budget == None:
+        budget = SearchBudget()
+    csp.setRandomSeed(seed if seed != None else 0)
+    rootMark = csp.getTrailMark()
+    assignments = 0
+    backtracks = 0
+    elapsedSeconds = 0.0
+    bestAssignmentList = None
+    run = 1
+    while True:
+        maxBacktracks = restartBase * luby(run)
+        if budget.maxBacktracks != None:
+            maxBacktracks = min(maxBacktracks, budget.maxBacktracks - backtracks)
+        runBudget = SearchBudget(maxAssignments=None if budget.maxAssignments == None else budget.maxAssignments - assignments,
+                                 maxSeconds=None if budget.maxSeconds == None else budget.maxSeconds - elapsedSeconds,
+                                 maxBacktracks=maxBacktracks, cancelEvent=budget.cancelEvent)
+        result = solve(csp, budget=runBudget, stats=stats, **options)
+        assignments += result.assignments
+        backtracks += result.backtracks
+        elapsedSeconds += result.elapsedSeconds
+        if bestAssignmentList == None or result.bestAssignmentList.count('0') < bestAssignmentList.count('0'):
+            bestAssignmentList = result.bestAssignmentList
+        status = result.status
+        if status == STATUS_BUDGET_EXHAUSTED and budget.getStopStatus(assignments, backtracks, elapsedSeconds) == None:
+            #Only the backtrack limit of this run was reached
+            csp.undoTo(rootMark)
+            run += 1
+            continue
+        csp.setRandomSeed(None)
+        return SearchResult(status, result.assignmentList, bestAssignmentList, assignments, backtracks, elapsedSeconds)
+
+
+def backtrackSearch(csp, forwardCheck=False, mrvHeuristic=False, maxDegreeHeuristic=False, lcvHeuristic=False, inference=INFERENCE_NONE,
+                    hiddenSingles=False, nakedSubsets=False, lockedCandidates=False, budget=None, backjumping=False, maxNogoods=0):
+    """Solves csp in place and returns the final values of the variables. Without a budget the search stops
+       after DEFAULT_MAX_ASSIGNMENTS assignments"""
+    if budget == None:
+        budget = SearchBudget(maxAssignments=DEFAULT_MAX_ASSIGNMENTS)
+    result = solve(csp, budget=budget, forwardCheck=forwardCheck, mrvHeuristic=mrvHeuristic, maxDegreeHeuristic=maxDegreeHeuristic,
+                   lcvHeuristic=lcvHeuristic, inference=inference, hiddenSingles=hiddenSingles, nakedSubsets=nakedSubsets,
+                   lockedCandidates=lockedCandidates, backjumping=backjumping, maxNogoods=maxNogoods)
     #For reporting the progress of the algorithm
-    if csp.getAssignmentCount() > 10000:
-        print('took %d steps with %d remaining variables...terminating' % (csp.getAssignmentCount(), csp.getUnassignedCount()))
-        return True
-
-    currentAssingment = csp.getCurrentAssignment()
-    nextVariable = csp.selectUnassignedVariable(mrvHeuristic=mrvHeuristic, maxDegreeHeuristic=maxDegreeHeuristic)
-    domainValues = csp.orderDomainValues(nextVariable, lcvHeuristic=lcvHeuristic)
-    for value in domainValues:
-        csp.assign(nextVariable, value)
-        if csp.isConstraintsSatisfied(nextVariable, value) == True and csp.applyInferences(nextVariable, value, forwardCheck=forwardCheck) == True:
-            result = backtrack(csp, forwardCheck=forwardCheck, mrvHeuristic=mrvHeuristic, maxDegreeHeuristic=maxDegreeHeuristic, lcvHeuristic=lcvHeuristic)
-            if result != False:
-                return result
-            else:
-                csp.reverseInferences(nextVariable, value, forwardCheck=forwardCheck)
-                csp.unAssign(nextVariable, value)
-                csp.reset(currentAssingment.split(','))               
-        else:
-            csp.reverseInferences(nextVariable, value, forwardCheck=forwardCheck)
-            csp.unAssign(nextVariable, value)
-            csp.reset(currentAssingment.split(','))
-    return False
+    if result.status == STATUS_BUDGET_EXHAUSTED or result.status == STATUS_CANCELLED:
+        print('took %d steps with %d remaining variables...terminating' % (result.assignments, csp.getUnassignedCount()))
+    return result.assignmentList
+    
+
+def backtrack(csp, forwardCheck=False, mrvHeuristic=False, maxDegreeHeuristic=False, lcvHeuristic=False, inference=INFERENCE_NONE, rules=(), budget=None):
+    """Returns true if the search solved csp"""
+    search = BacktrackSearch(csp, forwardCheck=forwardCheck, mrvHeuristic=mrvHeuristic, maxDegreeHeuristic=maxDegreeHeuristic,
+                             lcvHeuristic=lcvHeuristic, inference=inference, rules=rules, budget=budget)
+    return search.run()
+
+
+class BacktrackSearch:
+    """Backtracking search run as a loop over an explicit stack instead of recursion, so it can be paused and
+       resumed. Contains:
+       1. csp - the CSP being solved, changed in place
+       2. the search options, same as backtrack(), and the budget (no limits when None)
+       3. stack - one choice point per assigned variable: (variable, iterator over its remaining values, trail mark)
+       4. needsChoicePoint - true when the last assignment was consistent and a new variable has to be chosen
+       5. result - None while the search is unfinished, then true if it found a solution
+       6. status, assignments, backtracks, elapsedSeconds - see SearchResult
+       7. stats - optional SearchStats, the search runs without any instrumentation when it is None
+       8. backjumping - conflict-directed backjumping: conflicts holds the depths of the choice points each choice
+          point has conflicted with, and a dead end jumps back to the deepest of them instead of the previous one.
+          It is only sound with plain backtracking and forward checking over constraints whose prunings come from
+          a single assignment, so otherwise (AC-3, propagation rules) the search stays chronological
+       9. nogoods - optional NogoodStore of the conflict sets of the dead ends, checked before each value is tried
+    """
+
+    def __init__(self, csp, forwardCheck=False, mrvHeuristic=False, maxDegreeHeuristic=False, lcvHeuristic=False, inference=INFERENCE_NONE, rules=(), budget=None,
+                 stats=None, backjumping=False, maxNogoods=0):
+        self.csp = csp
+        self.forwardCheck = forwardCheck
+        self.mrvHeuristic = mrvHeuristic
+        self.maxDegreeHeuristic = maxDegreeHeuristic
+        self.lcvHeuristic = lcvHeuristic
+        self.inference = inference
+        self.rules = rules
+        self.budget = budget if budget != None else SearchBudget()
+        self.stats = stats
+        #Backjumping needs every pruning to be explained by the choice point that made it
+        forwardChecking = forwardCheck or inference == INFERENCE_FORWARD_CHECK
+        self.backjumping = backjumping and inference != INFERENCE_AC3 and not rules and \
+                           (not forwardChecking or all(constraint.prunesByAssignment for constraint in csp.constraints))
+        self.conflicts = []
+        self.depthOf = {}
+        self.nogoods = NogoodStore(maxNogoods) if self.backjumping and maxNogoods > 0 else None
+        self.stack = []
+        self.needsChoicePoint = True
+        self.result = None
+        self.status = None
+        self.initialAssignmentCount = csp.getAssignmentCount()
+        self.backtracks = 0
+        self.elapsedSeconds = 0.0
+        self.bestUnassignedCount = csp.getUnassignedCount()
+        self.bestAssignment = csp.getCurrentAssignment()
+
+    def stop(self, status):
+        self.status = status
+        self.result = status == STATUS_SOLVED
+
+    def getAssignments(self):
+        """Number of assignments made by this search"""
+        return self.csp.getAssignmentCount() - self.initialAssignmentCount
+
+    def getResult(self):
+        return SearchResult(self.status, self.csp.getCurrentAssignment().split(','), self.bestAssignment.split(','),
+                            self.getAssignments(), self.backtracks, self.elapsedSeconds)
+
+    def iterSolutions(self):
+        """Runs the search to the end, yielding the values of all the variables at every solution"""
+        while self.run() == True:
+            yield self.csp.getCurrentAssignment().split(',')
+            #Continue with the next value of the choice point that led to the solution
+            self.result = None
+            self.status = None
+            self.needsChoicePoint = False
+            if self.backjumping:
+                #The values left below a solution were not ruled out by conflicts, so no choice point may be jumped
+                #over from now on and the conflict sets are no longer nogoods
+                for depth in range(len(self.conflicts)):
+                    self.conflicts[depth].update(range(depth))
+                self.nogoods = None
+
+    def getPruningDepths(self, index, limit):
+        """Depths of the choice points whose assignments pruned the domain of the variable at position index,
+           from the trail entries before position limit"""
+        marks = [trailMark for (variable, domainValues, trailMark) in self.stack]
+        trail = self.csp.trail
+        depths = set()
+        for position in range(marks[0] if marks else limit, limit):
+            kind, prunedIndex, value = trail[position]
+            if prunedIndex == index and kind == TRAIL_PRUNE:
+                depths.add(bisect_right(marks, position) - 1)
+        return depths
+
+    def backjump(self):
+        """Dead end at the last choice point: jumps back to the deepest choice point in its conflict set and passes
+           the rest of the set on to it"""
+        depth = len(self.stack) - 1
+        variable, domainValues, trailMark = self.stack[depth]
+        conflictSet = self.conflicts[depth] | self.getPruningDepths(self.csp.getVariableIndex(variable), trailMark)
+        conflictSet.discard(depth)
+        if self.nogoods != None:
+            self.nogoods.add((self.csp.getVariableIndex(self.stack[k][0]), self.stack[k][0].getValue()) for k in conflictSet)
+        target = max(conflictSet) if conflictSet else -1
+        if self.stats != None and target < depth - 1:
+            self.stats.backjumps += 1
+        #Roll back the choice points jumped over here, the search only rolls back the one it continues with (and
+        #nothing when the stack is empty)
+        self.csp.undoTo(self.stack[target + 1][2])
+        while len(self.stack) > target + 1:
+            variable = self.stack.pop()[0]
+            self.conflicts.pop()
+            del self.depthOf[self.csp.getVariableIndex(variable)]
+        if target >= 0:
+            self.conflicts[target].update(conflictSet - {target})
+
+    def addConflicts(self, indexes):
+        """Adds the choice points that assigned the variables at the given positions to the conflict set of the last one"""
+        depthOf = self.depthOf
+        self.conflicts[-1].update(depthOf[index] for index in indexes if index in depthOf)
+
+    def run(self, maxSteps=None):
+        """Runs the search until it finishes, the budget runs out or maxSteps values have been tried. Returns
+           true if a solution was found, false if the search stopped without one, or None when paused"""
+        csp = self.csp
+        budget = self.budget
+        stats = self.stats
+        #The instrumented functions are bound once so that a search without stats pays nothing for them
+        selectUnassignedVariable = csp.selectUnassignedVariable
+        orderDomainValues = csp.orderDomainValues
+        isConstraintsSatisfied = csp.isConstraintsSatisfied
+        applyInferences = csp.applyInferences
+        if stats != None:
+            selectUnassignedVariable = stats.timed('selectUnassignedVariable', selectUnassignedVariable)
+            orderDomainValues = stats.timed('orderDomainValues', orderDomainValues)
+            isConstraintsSatisfied = stats.timed('isConstraintsSatisfied', isConstraintsSatisfied)
+            applyInferences = stats.timed('applyInferences', applyInferences)
+        steps = 0
+        startTime = time.perf_counter() - self.elapsedSeconds
+        while self.result == None:
+            self.elapsedSeconds = time.perf_counter() - startTime
+            if self.needsChoicePoint:
+                #Check if CSP is solved
+                if csp.isAssignmentComplete() == True:
+                    self.stop(STATUS_SOLVED)
+                    if stats != None:
+                        stats.notify('solution', None, None, len(self.stack))
+                    break
+
+                #Remember the most complete assignment for an anytime result
+                unassignedCount = csp.getUnassignedCount()
+                if unassignedCount < self.bestUnassignedCount:
+                    self.bestUnassignedCount = unassignedCount
+                    self.bestAssignment = csp.getCurrentAssignment()
+
+                #Everything recorded on the trail after this mark belongs to the values tried at this choice point
+                trailMark = csp.getTrailMark()
+                nextVariable = selectUnassignedVariable(mrvHeuristic=self.mrvHeuristic, maxDegreeHeuristic=self.maxDegreeHeuristic)
+                domainValues = orderDomainValues(nextVariable, lcvHeuristic=self.lcvHeuristic)
+                self.stack.append((nextVariable, iter(domainValues), trailMark))
+                self.needsChoicePoint = False
+                if self.backjumping:
+                    self.conflicts.append(set())
+                    self.depthOf[csp.getVariableIndex(nextVariable)] = len(self.stack) - 1
+                if stats != None and len(self.stack) > stats.maxDepth:
+                    stats.maxDepth = len(self.stack)
+
+            if not self.stack:
+                self.stop(STATUS_UNSOLVED)
+                break
+            stopStatus = budget.getStopStatus(self.getAssignments(), self.backtracks, self.elapsedSeconds)
+            if stopStatus != None:
+                self.stop(stopStatus)
+                break
+            if maxSteps != None and steps >= maxSteps:
+                return None
+
+            #Try the next value of the most recent choice point, or backtrack to the previous one
+            nextVariable, domainValues, trailMark = self.stack[-1]
+            csp.undoTo(trailMark)
+            value = next(domainValues, None)
+            if value == None:
+                if self.backjumping:
+                    self.backjump()
+                else:
+                    self.stack.pop()
+                self.backtracks += 1
+                if stats != None:
+                    stats.backtracks += 1
+                    stats.notify('backtrack', nextVariable, None, len(self.stack))
+                continue
+            steps += 1
+            csp.assign(nextVariable, value)
+            if stats == None and not self.backjumping:
+                if isConstraintsSatisfied(nextVariable, value) == True and \
+                   applyInferences(nextVariable, value, forwardCheck=self.forwardCheck, inference=self.inference, rules=self.rules) == True:
+                    self.needsChoicePoint = True
+                continue
+
+            if stats != None:
+                stats.nodes += 1
+                stats.notify('assign', nextVariable, value, len(self.stack))
+            violated = self.nogoods.getViolated(csp, csp.getVariableIndex(nextVariable), value) if self.nogoods != None else None
+            if violated != None:
+                self.addConflicts(index for (index, nogoodValue) in violated)
+                if stats != None:
+                    stats.nogoodHits += 1
+            elif isConstraintsSatisfied(nextVariable, value) == True:
+                inferenceMark = csp.getTrailMark()
+                self.needsChoicePoint = applyInferences(nextVariable, value, forwardCheck=self.forwardCheck, inference=self.inference, rules=self.rules)
+                if self.backjumping and not self.needsChoicePoint:
+                    #Forward checking wiped out the domain of the last variable it pruned, which conflicts with
+                    #every choice point that pruned it
+                    self.conflicts[-1].update(self.getPruningDepths(csp.trail[-1][1], len(csp.trail)))
+                if stats != None:
+                    stats.propagationCalls += 1
+                    stats.prunings += sum(1 for entry in csp.trail[inferenceMark:] if entry[0] == TRAIL_PRUNE)
+            elif self.backjumping:
+                self.addConflicts(csp.getConflicts(nextVariable, value))
+            if stats != None and not self.needsChoicePoint:
+                stats.notify('reject', nextVariable, value, len(self.stack))
+        return self.result
 
 
 if __name__ == '__main__':
-    inputFilePath = '/Users/apple/Documents/git-repos/sudoku/version3/constraint-satisfaction-problem-solver/input-data/65/1.sd'
+    inputFilePath = 'input-data/65/1.sd'
     sudokuGrid = SudokuGrid(inputFilePath)
-    csp = SudokuCSP()
+    csp = SudokuCSP(compactDomains=True)
     csp.reset(sudokuGrid.convert())
     print(5*'=' + 'Question Sudoku' + 5*'=')
     csp.print()
     
-    finalAssignment = backtrackSearch(csp, forwardCheck=True, mrvHeuristic=True, maxDegreeHeuristic=True, lcvHeuristic=True)
-    if csp.getAssignmentCount() > 10000:
-        print("\nTook > 10000 steps. No solution found")
+    stats = SearchStats()
+    result = solve(csp, budget=SearchBudget(maxAssignments=DEFAULT_MAX_ASSIGNMENTS, maxSeconds=10), stats=stats,
+                   forwardCheck=True, mrvHeuristic=True, maxDegreeHeuristic=True, lcvHeuristic=True)
+    if not result.isSolved():
+        print("\nNo solution found (%s after %d assignments, %.2f seconds)" % (result.status, result.assignments, result.elapsedSeconds))
     else:
-        print("\nFound a solution in %d assignments" % csp.getAssignmentCount())
+        print("\nFound a solution in %d assignments" % result.assignments)
         print('\n\n' +5*'=' + 'Solved Sudoku' + 5*'=')
         csp.print()
+    print('\n' + stats.summary())
+
+    csp.reset(sudokuGrid.convert())
+    print('\nUnique solution: %s' % isUnique(csp, budget=SearchBudget(maxSeconds=10)))
+
+    #Each propagation rule on its own, without forward checking, must not rule out the solution of a puzzle
+    for puzzleFile in ('input-data/1/2.sd', 'input-data/3/7.sd', 'input-data/10/1.sd', 'input-data/11/5.sd', 'input-data/12/3.sd'):
+        for rule in ('hiddenSingles', 'nakedSubsets', 'lockedCandidates'):
+            csp.reset(SudokuGrid(puzzleFile).convert())
+            result = solve(csp, budget=SearchBudget(maxAssignments=DEFAULT_MAX_ASSIGNMENTS), **{rule: True})
+            assert result.status != STATUS_UNSOLVED, '%s found no solution for %s' % (rule, puzzleFile)
+            assert not result.isSolved() or csp.isAssignmentComplete(), '%s returned an invalid solution for %s' % (rule, puzzleFile)
+    print('Propagation rules checked')
     
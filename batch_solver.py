@@ -0,0 +1,109 @@
+import numpy as np
+from sudoku_csp import SudokuCSP, UNITS, CELL_UNITS
+from sudoku_grid import SudokuGrid
+from variable import DOMAIN_SIZE
+import backtrack
+import os
+import time
+
+#Candidates of a cell are a 9-bit mask (bit d-1 set when digit d is possible), the same encoding as BitmaskVariable
+ALL_CANDIDATES = 0x1FF
+DIGIT_BITS = (1 << np.arange(9)).astype(np.uint16)
+POPCOUNT = np.array(DOMAIN_SIZE, dtype=np.uint8)
+
+#The 27 units as rows of cell positions and the 3 units (row, column, box) each cell belongs to
+UNIT_CELLS = np.array(UNITS)
+UNITS_OF_CELL = np.array(CELL_UNITS)
+
+#Status of each puzzle in a batch
+SOLVED = 'solved'
+UNSOLVED = 'unsolved'
+INVALID = 'invalid'
+
+
+def loadCandidates(assignmentLists):
+    """Returns a (N, 81) array of candidate masks from N assignment lists of 81 values ('0' for an empty cell)"""
+    digits = np.array([[int(value) for value in assignmentList] for assignmentList in assignmentLists], dtype=np.int64)
+    digits = digits.reshape(-1, 81)
+    return np.where(digits == 0, ALL_CANDIDATES, 1 << np.maximum(digits - 1, 0)).astype(np.uint16)
+
+
+def propagate(candidates):
+    """Applies naked singles and hidden singles to all the puzzles until none of them change.
+       Returns the reduced candidates and a boolean array marking the puzzles found to have no solution"""
+    candidates = candidates.copy()
+    invalid = np.zeros(len(candidates), dtype=bool)
+    while True:
+        previous = candidates
+        counts = POPCOUNT[candidates]
+        solved = counts == 1
+
+        #Naked singles: remove the values of solved cells from the other cells of their units
+        solvedValues = np.where(solved, candidates, 0).astype(np.uint16)
+        unitSolved = np.bitwise_or.reduce(solvedValues[:, UNIT_CELLS], axis=2)
+        peerSolved = np.bitwise_or.reduce(unitSolved[:, UNITS_OF_CELL], axis=2)
+        candidates = np.where(solved, candidates, candidates & ~peerSolved).astype(np.uint16)
+
+        #Hidden singles: a digit with a single possible cell in a unit has to go in that cell
+        cellDigits = (candidates[:, :, None] & DIGIT_BITS) != 0
+        unitCounts = cellDigits[:, UNIT_CELLS, :].sum(axis=2)
+        uniqueInUnit = ((unitCounts == 1) * DIGIT_BITS).sum(axis=2).astype(np.uint16)
+        hidden = np.bitwise_or.reduce(uniqueInUnit[:, UNITS_OF_CELL], axis=2) & candidates
+        candidates = np.where(hidden != 0, hidden, candidates).astype(np.uint16)
+
+        #A puzzle is invalid when a cell has no candidate, a cell must hold 2 digits, a digit has no place
+        #in a unit or a digit is placed twice in a unit
+        solvedDigits = (solvedValues[:, :, None] & DIGIT_BITS) != 0
+        invalid |= (candidates == 0).any(axis=1)
+        invalid |= (POPCOUNT[hidden] > 1).any(axis=1)
+        invalid |= (unitCounts == 0).any(axis=(1, 2))
+        invalid |= (solvedDigits[:, UNIT_CELLS, :].sum(axis=2) > 1).any(axis=(1, 2))
+
+        #Invalid puzzles are frozen so that they cannot keep the loop going
+        candidates[invalid] = previous[invalid]
+        if np.array_equal(candidates, previous):
+            return candidates, invalid
+
+
+def toAssignmentList(candidateRow):
+    """Converts one row of candidate masks into an assignment list, unsolved cells are '0'"""
+    return [str(int(mask).bit_length()) if DOMAIN_SIZE[mask] == 1 else '0' for mask in candidateRow]
+
+
+def solveBatch(assignmentLists, chunkSize=10000, forwardCheck=True, mrvHeuristic=True, maxDegreeHeuristic=True, lcvHeuristic=True):
+    """Solves many puzzles at once. Constraint propagation runs on whole chunks of puzzles with vectorized
+       operations and only the puzzles it leaves unsolved are passed to backtrack search (with the given options).
+       Returns a list of (status, assignment list) pairs in input order"""
+    results = []
+    for start in range(0, len(assignmentLists), chunkSize):
+        candidates, invalid = propagate(loadCandidates(assignmentLists[start:start + chunkSize]))
+        complete = (POPCOUNT[candidates] == 1).all(axis=1)
+        for i in range(len(candidates)):
+            assignmentList = toAssignmentList(candidates[i])
+            if invalid[i]:
+                results.append((INVALID, assignmentList))
+            elif complete[i]:
+                results.append((SOLVED, assignmentList))
+            else:
+                csp = SudokuCSP(compactDomains=True)
+                csp.reset(assignmentList)
+                backtrack.backtrackSearch(csp, forwardCheck=forwardCheck, mrvHeuristic=mrvHeuristic,
+                                          maxDegreeHeuristic=maxDegreeHeuristic, lcvHeuristic=lcvHeuristic)
+                status = SOLVED if csp.isAssignmentComplete() else UNSOLVED
+                results.append((status, csp.getCurrentAssignment().split(',')))
+    return results
+
+
+if __name__ == '__main__':
+    inputRootDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input-data')
+    assignmentLists = []
+    for directory in sorted(os.listdir(inputRootDirectory)):
+        for file in sorted(os.listdir(os.path.join(inputRootDirectory, directory))):
+            if file.endswith('.sd'):
+                assignmentLists.append(SudokuGrid(os.path.join(inputRootDirectory, directory, file)).convert())
+
+    startTime = time.time()
+    results = solveBatch(assignmentLists)
+    statuses = [status for (status, assignmentList) in results]
+    print('Solved %d puzzles in %.2f seconds: %d solved, %d unsolved, %d invalid' %
+          (len(results), time.time() - startTime, statuses.count(SOLVED), statuses.count(UNSOLVED), statuses.count(INVALID)))
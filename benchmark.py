@@ -0,0 +1,161 @@
+from sudoku_csp import SudokuCSP, INFERENCE_AC3
+from sudoku_grid import SudokuGrid
+import backtrack
+import dlx
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+#Search options of the benchmarked configurations, 'dlx' is solved with dancing links instead
+CONFIGURATIONS = {
+    'v1': {},
+    'v2': {'forwardCheck': True},
+    'v3': {'forwardCheck': True, 'mrvHeuristic': True, 'maxDegreeHeuristic': True, 'lcvHeuristic': True},
+    'mac': {'inference': INFERENCE_AC3, 'mrvHeuristic': True, 'maxDegreeHeuristic': True, 'lcvHeuristic': True},
+    'rules': {'inference': INFERENCE_AC3, 'mrvHeuristic': True, 'maxDegreeHeuristic': True,
+              'hiddenSingles': True, 'nakedSubsets': True, 'lockedCandidates': True},
+    'cbj': {'backjumping': True, 'maxNogoods': 1000},
+    'fc-cbj': {'forwardCheck': True, 'backjumping': True, 'maxNogoods': 1000},
+    'dlx': None,
+}
+
+#Columns of the CSV file, one row per puzzle and configuration
+FIELDS = ['configuration', 'puzzle', 'clues', 'status', 'seconds', 'assignments', 'backtracks', 'peakMemory']
+
+
+def getPuzzles(inputRootDirectory, sample=None, seed=0):
+    """Returns the (clue count, file path) of the puzzles in a dataset. With sample only that many randomly chosen
+       puzzles of each clue count are returned"""
+    randomGenerator = random.Random(seed)
+    puzzles = []
+    directories = [d for d in os.listdir(inputRootDirectory) if d.isdigit() and os.path.isdir(os.path.join(inputRootDirectory, d))]
+    for directory in sorted(directories, key=int):
+        files = sorted(f for f in os.listdir(os.path.join(inputRootDirectory, directory)) if f.endswith('.sd'))
+        if sample != None and sample < len(files):
+            files = sorted(randomGenerator.sample(files, sample))
+        puzzles.extend((int(directory), os.path.join(inputRootDirectory, directory, f)) for f in files)
+    return puzzles
+
+
+def solvePuzzle(assignmentList, configuration, budget):
+    """Solves one puzzle and returns (status, assignments, backtracks). Dancing links has no backtrack count"""
+    csp = SudokuCSP(compactDomains=True)
+    csp.reset(assignmentList)
+    if CONFIGURATIONS[configuration] == None:
+        status = dlx.dlxSolve(csp, maxNodes=budget.maxAssignments)[1]
+        return status, csp.getAssignmentCount(), None
+    result = backtrack.solve(csp, budget=budget, **CONFIGURATIONS[configuration])
+    return result.status, result.assignments, result.backtracks
+
+
+def runBenchmark(puzzles, configurations, budget, measureMemory=True):
+    """Runs every configuration on every puzzle and returns one record (a dict with the FIELDS) per run. The peak
+       memory is measured with tracemalloc in a separate run so that tracing does not slow down the timed one"""
+    records = []
+    for configuration in configurations:
+        for clues, puzzle in puzzles:
+            assignmentList = SudokuGrid(puzzle).convert()
+            startTime = time.perf_counter()
+            status, assignments, backtracks = solvePuzzle(assignmentList, configuration, budget)
+            seconds = time.perf_counter() - startTime
+
+            peakMemory = None
+            if measureMemory:
+                tracemalloc.start()
+                solvePuzzle(assignmentList, configuration, budget)
+                peakMemory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            records.append({'configuration': configuration, 'puzzle': os.path.join(os.path.basename(os.path.dirname(puzzle)), os.path.basename(puzzle)),
+                            'clues': clues, 'status': status, 'seconds': seconds, 'assignments': assignments,
+                            'backtracks': backtracks, 'peakMemory': peakMemory})
+            print('%-6s %-10s %-16s %8d assignments %8.4fs' % (configuration, records[-1]['puzzle'], status, assignments, seconds))
+    return records
+
+
+def summarize(records):
+    """Returns the totals and medians of each configuration"""
+    summary = {}
+    for configuration in sorted(set(record['configuration'] for record in records)):
+        runs = [record for record in records if record['configuration'] == configuration]
+        memory = [record['peakMemory'] for record in runs if record['peakMemory'] != None]
+        summary[configuration] = {
+            'puzzles': len(runs),
+            'solved': sum(1 for record in runs if record['status'] == backtrack.STATUS_SOLVED),
+            'totalSeconds': sum(record['seconds'] for record in runs),
+            'medianSeconds': statistics.median(record['seconds'] for record in runs),
+            'totalAssignments': sum(record['assignments'] for record in runs),
+            'maxPeakMemory': max(memory) if memory else None,
+        }
+    return summary
+
+
+def compareWithBaseline(summary, baselineSummary, threshold):
+    """Returns the regressions of summary against baselineSummary as messages. A metric regresses when it grew by
+       more than threshold (a fraction) or a configuration solves fewer puzzles"""
+    regressions = []
+    for configuration in summary:
+        if configuration not in baselineSummary:
+            continue
+        current, baseline = summary[configuration], baselineSummary[configuration]
+        if current['solved'] < baseline['solved']:
+            regressions.append('%s: solved %d puzzles, baseline %d' % (configuration, current['solved'], baseline['solved']))
+        for metric in ('totalSeconds', 'medianSeconds', 'totalAssignments', 'maxPeakMemory'):
+            if current[metric] == None or not baseline.get(metric):
+                continue
+            change = current[metric] / baseline[metric] - 1
+            if change > threshold:
+                regressions.append('%s: %s %.4g, baseline %.4g (+%.1f%%)' % (configuration, metric, current[metric], baseline[metric], 100 * change))
+    return regressions
+
+
+def writeCsv(records, outputFile):
+    with open(outputFile, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark solver configurations on a dataset')
+    parser.add_argument('inputRootDirectory', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input-data'))
+    parser.add_argument('--configurations', nargs='+', default=['v2', 'v3', 'mac', 'rules', 'dlx'], choices=sorted(CONFIGURATIONS))
+    parser.add_argument('--sample', type=int, help='number of puzzles per clue count (default: all)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the puzzle sample')
+    parser.add_argument('--max-assignments', type=int, default=backtrack.DEFAULT_MAX_ASSIGNMENTS)
+    parser.add_argument('--max-seconds', type=float, help='time limit per puzzle')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory runs')
+    parser.add_argument('--json', help='write the results and summary to this JSON file')
+    parser.add_argument('--csv', help='write the per puzzle results to this CSV file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed growth over the baseline (default: 0.1 = 10%%)')
+    args = parser.parse_args()
+
+    puzzles = getPuzzles(args.inputRootDirectory, args.sample, args.seed)
+    budget = backtrack.SearchBudget(maxAssignments=args.max_assignments, maxSeconds=args.max_seconds)
+    records = runBenchmark(puzzles, args.configurations, budget, measureMemory=not args.no_memory)
+    summary = summarize(records)
+    for configuration in summary:
+        print('%-6s %s' % (configuration, ', '.join('%s %.4g' % (key, value) if isinstance(value, float) else '%s %s' % (key, value)
+                                                    for (key, value) in summary[configuration].items())))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'puzzles': len(puzzles), 'summary': summary, 'records': records}, f, indent=2)
+    if args.csv:
+        writeCsv(records, args.csv)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compareWithBaseline(summary, json.load(f)['summary'], args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('No regressions against %s' % args.baseline)
@@ -0,0 +1,480 @@
+from variable import Variable
+from collections import deque
+import random
+
+#Inference levels applied after each assignment
+INFERENCE_NONE = None
+INFERENCE_FORWARD_CHECK = 'forward-check'
+INFERENCE_AC3 = 'ac3' #maintaining arc consistency
+
+#Kinds of changes recorded on the trail
+TRAIL_ASSIGN = 'assign'
+TRAIL_PRUNE = 'prune'
+
+
+class Constraint:
+    """Base class of the constraints of a CSP. Contains:
+       1. scope - the positions of the variables the constraint is on
+       Subclasses implement isSatisfied, checked right after a variable of the scope is assigned, and revise, which
+       removes the values of the scope that cannot be part of a solution. propagate is the forward checking step
+       after an assignment and defaults to revise. Domains are only changed through csp.pruneValue.
+       prunesByAssignment is true when propagate only removes the values ruled out by the assignment itself, so a
+       pruning is explained by that assignment alone (needed by conflict-directed backjumping with forward checking)
+    """
+    prunesByAssignment = False
+
+    def __init__(self, scope):
+        self.scope = list(scope)
+
+    def isSatisfied(self, csp, index, value):
+        """Returns false if the assignment of value to the variable at position index violates the constraint"""
+        return True
+
+    def getConflicts(self, csp, index, value):
+        """Returns the positions of the assigned variables of the scope that rule out value for the variable at
+           position index. By default all of them"""
+        return [j for j in self.scope if j != index and csp.variables[j].isAssigned]
+
+    def propagate(self, csp, index, value):
+        """Prunes the domains after the assignment of value to the variable at position index. Returns false if a
+           domain was wiped out"""
+        return self.revise(csp)
+
+    def revise(self, csp):
+        """Removes unsupported values from the domains of the scope. Returns false if a domain was wiped out"""
+        return True
+
+
+class AllDifferent(Constraint):
+    """The variables of the scope all take different values"""
+    prunesByAssignment = True
+
+    def isSatisfied(self, csp, index, value):
+        variables = csp.variables
+        for j in self.scope:
+            if j != index and variables[j].isAssigned and variables[j].getValue() == value:
+                return False
+        return True
+
+    def getConflicts(self, csp, index, value):
+        variables = csp.variables
+        return [j for j in self.scope if j != index and variables[j].isAssigned and variables[j].getValue() == value]
+
+    def propagate(self, csp, index, value):
+        variables = csp.variables
+        for j in self.scope:
+            if j != index and not variables[j].isAssigned and csp.pruneValue(j, value) and variables[j].getDomainSize() == 0:
+                return False
+        return True
+
+    def revise(self, csp):
+        #Arc consistency of the pairwise not-equal constraints: the value of a decided variable (assigned or with a
+        #single value left) is removed from the others
+        for index in self.scope:
+            variable = csp.variables[index]
+            if variable.isAssigned or variable.getDomainSize() == 1:
+                if self.propagate(csp, index, csp.getDecidedValue(index)) == False:
+                    return False
+        return True
+
+
+class TableConstraint(Constraint):
+    """Binary constraint listing the allowed (value of first, value of second) pairs"""
+
+    def __init__(self, first, second, allowedPairs):
+        Constraint.__init__(self, (first, second))
+        self.allowedPairs = set(allowedPairs)
+
+    def getValues(self, csp, index):
+        variable = csp.variables[index]
+        return [variable.getValue()] if variable.isAssigned else variable.getDomain()
+
+    def isSupported(self, index, value, otherValues):
+        if index == self.scope[0]:
+            return any((value, otherValue) in self.allowedPairs for otherValue in otherValues)
+        return any((otherValue, value) in self.allowedPairs for otherValue in otherValues)
+
+    def isSatisfied(self, csp, index, value):
+        other = self.scope[1] if index == self.scope[0] else self.scope[0]
+        if not csp.variables[other].isAssigned:
+            return True
+        return self.isSupported(index, value, [csp.variables[other].getValue()])
+
+    def revise(self, csp):
+        for index, other in (self.scope, reversed(self.scope)):
+            if csp.variables[index].isAssigned:
+                continue
+            otherValues = self.getValues(csp, other)
+            for value in csp.variables[index].getDomain():
+                if not self.isSupported(index, value, otherValues):
+                    csp.pruneValue(index, value)
+            if csp.variables[index].getDomainSize() == 0:
+                return False
+        return True
+
+
+class SumConstraint(Constraint):
+    """The values of the scope, read as integers, add up to total"""
+
+    def __init__(self, scope, total):
+        Constraint.__init__(self, scope)
+        self.total = total
+
+    def getBounds(self, csp):
+        """Returns the (lowest, highest) possible value of every variable of the scope"""
+        bounds = []
+        for index in self.scope:
+            variable = csp.variables[index]
+            if variable.isAssigned:
+                value = int(variable.getValue())
+                bounds.append((value, value))
+            else:
+                values = [int(value) for value in variable.getDomain()]
+                if not values:
+                    return None
+                bounds.append((min(values), max(values)))
+        return bounds
+
+    def isSatisfied(self, csp, index, value):
+        bounds = self.getBounds(csp)
+        return bounds != None and sum(low for (low, high) in bounds) <= self.total <= sum(high for (low, high) in bounds)
+
+    def revise(self, csp):
+        #Bounds consistency: a value is kept if the other variables can still make up the rest of the total
+        bounds = self.getBounds(csp)
+        if bounds == None:
+            return False
+        lowest = sum(low for (low, high) in bounds)
+        highest = sum(high for (low, high) in bounds)
+        for (index, (low, high)) in zip(self.scope, bounds):
+            variable = csp.variables[index]
+            if variable.isAssigned:
+                continue
+            for value in variable.getDomain():
+                if int(value) + lowest - low > self.total or int(value) + highest - high < self.total:
+                    csp.pruneValue(index, value)
+            if variable.getDomainSize() == 0:
+                return False
+        return True
+
+
+class CSP:
+    """A general Constraint Satisfaction Problem solved by backtrack.BacktrackSearch. Contains:
+       1. variables - the variables (type Variable, or variableClass), indexed by position
+       2. constraints - the Constraint objects. constraintsOf - the constraints of each variable and neighbours -
+          the positions of the variables sharing a constraint with each variable (the adjacency index)
+       3. assignmentCounter - number of assignments made
+       4. trail - undo log of the (kind, variable position, value) changes. Backtracking rolls back to a trail mark
+       5. domainBuckets - positions of the unassigned variables grouped by domain size
+       6. random - random.Random breaking the ties of the variable and value orders when set (see setRandomSeed),
+          None for the deterministic orders
+       Values are strings and '0' is reserved for an unassigned variable. Build the problem with addVariable and
+       addConstraint, then call buildIndex before solving
+    """
+
+    def __init__(self, variableClass=Variable):
+        self.variableClass = variableClass
+        self.variables = []
+        self.indexOf = {}
+        self.constraints = []
+        self.constraintsOf = []
+        self.neighbours = []
+        self.assignmentCounter = 0
+        self.trail = []
+        self.domainBuckets = [set()]
+        self.random = None
+
+    def setRandomSeed(self, seed):
+        """Turns on randomized tie-breaking with the given seed, or off when seed is None"""
+        self.random = random.Random(seed) if seed != None else None
+
+    def breakTies(self, values):
+        """Shuffles a list of values before it is sorted by a heuristic when tie-breaking is randomized, so that
+           the values with equal keys come in random order. Returns the list"""
+        if self.random != None:
+            self.random.shuffle(values)
+        return values
+
+    def addVariable(self, name, domain, value='0'):
+        """Adds a variable and returns its position"""
+        self.indexOf[name] = len(self.variables)
+        self.variables.append(self.variableClass(name, domain, value))
+        return len(self.variables) - 1
+
+    def addConstraint(self, constraint):
+        self.constraints.append(constraint)
+
+    def buildIndex(self):
+        """Builds the constraint adjacency index and the domain size buckets once all the variables and
+           constraints have been added"""
+        self.constraintsOf = [[] for variable in self.variables]
+        neighbours = [set() for variable in self.variables]
+        for constraint in self.constraints:
+            for index in constraint.scope:
+                self.constraintsOf[index].append(constraint)
+                neighbours[index].update(constraint.scope)
+        self.neighbours = [sorted(neighbours[i] - {i}) for i in range(len(self.variables))]
+        self.trail = []
+        self.buildSelectionIndex()
+
+    def buildSelectionIndex(self):
+        """Computes the domain size buckets from scratch"""
+        largestDomain = max([variable.getDomainSize() for variable in self.variables] + [0])
+        self.domainBuckets = [set() for size in range(largestDomain + 1)]
+        for i, variable in enumerate(self.variables):
+            if not variable.isAssigned:
+                self.domainBuckets[variable.getDomainSize()].add(i)
+
+    @property
+    def currentAssignment(self):
+        """Current assignment as a string of comma seperated values, built on demand from the variables"""
+        return ','.join([v.getValue() for v in self.variables])
+
+    def getCurrentAssignment(self):
+        return self.currentAssignment
+
+    def getAssignmentCount(self):
+        return self.assignmentCounter
+
+    def getVariable(self, variableName):
+        """return the Variable object given the variable name"""
+        if variableName in self.indexOf:
+            return self.variables[self.indexOf[variableName]]
+        return None
+
+    def getVariableIndex(self, variable):
+        return self.indexOf[variable.getName()]
+
+    def getNeighbours(self, variable):
+        """Returns the variables sharing a constraint with the variable"""
+        return [self.variables[j] for j in self.neighbours[self.getVariableIndex(variable)]]
+
+    def getUnassignedDegree(self, index):
+        """Number of unassigned neighbours of the variable at position index"""
+        return sum(1 for j in self.neighbours[index] if not self.variables[j].isAssigned)
+
+    def getUnassignedNeighboursCount(self, variable):
+        return self.getUnassignedDegree(self.getVariableIndex(variable))
+
+    def getSupportCount(self, index, value):
+        """Number of unassigned neighbours of the variable at position index with value in their domain"""
+        return sum(1 for j in self.neighbours[index] if not self.variables[j].isAssigned and self.variables[j].isInDomain(value))
+
+    def selectUnassignedVariable(self, mrvHeuristic=False, maxDegreeHeuristic=False):
+        """Returns the next variable to be assigned based on the policy"""
+        if mrvHeuristic == False:
+            #'standard-backtrack' returns the variables in order
+            for variable in self.variables:
+                if not variable.isAssigned:
+                    return variable
+            return None
+        #The smallest non-empty bucket holds the variables with the minimum remaining values.
+        #Ties are broken by position (or by the most unassigned neighbours first with maxDegreeHeuristic), or at
+        #random with randomized tie-breaking
+        for bucket in self.domainBuckets:
+            if bucket:
+                if self.random != None:
+                    candidates = sorted(bucket)
+                    if len(candidates) > 1 and maxDegreeHeuristic == True:
+                        degrees = [self.getUnassignedDegree(i) for i in candidates]
+                        candidates = [i for (i, degree) in zip(candidates, degrees) if degree == max(degrees)]
+                    return self.variables[self.random.choice(candidates)]
+                if len(bucket) > 1 and maxDegreeHeuristic == True:
+                    return self.variables[min(bucket, key=lambda i: (-self.getUnassignedDegree(i), i))]
+                return self.variables[min(bucket)]
+        return None
+
+    def orderDomainValues(self, variable, lcvHeuristic=False):
+        """Returns the domain values of the variable, the least constraining first with lcvHeuristic. Without it
+           the values are in sorted order, or shuffled with randomized tie-breaking"""
+        if lcvHeuristic == True and variable.getDomainSize() > 1:
+            index = self.getVariableIndex(variable)
+            return sorted(self.breakTies(variable.getDomain()), key=lambda value: self.getSupportCount(index, value))
+        if self.random != None:
+            return self.breakTies(variable.getDomain())
+        return sorted(variable.getDomain())
+
+    def isConstraintsSatisfied(self, variable, value):
+        """Checks the constraints of the variable after the assignment of value to it"""
+        index = self.getVariableIndex(variable)
+        for constraint in self.constraintsOf[index]:
+            if not constraint.isSatisfied(self, index, value):
+                return False
+        return True
+
+    def getConflicts(self, variable, value):
+        """Returns the positions of the assigned variables that rule out value for variable, from the constraints
+           it violates"""
+        index = self.getVariableIndex(variable)
+        conflicts = set()
+        for constraint in self.constraintsOf[index]:
+            if not constraint.isSatisfied(self, index, value):
+                conflicts.update(constraint.getConflicts(self, index, value))
+        return conflicts
+
+    def applyInferences(self, variable, value, forwardCheck=False, inference=INFERENCE_NONE, rules=()):
+        """Prunes the domains after the assignment of value to variable. Returns false if a domain was wiped out.
+           inference is INFERENCE_FORWARD_CHECK (same as forwardCheck=True) or INFERENCE_AC3. rules names the
+           propagation rules of the model to apply afterwards"""
+        index = self.getVariableIndex(variable)
+        if inference == INFERENCE_AC3:
+            if self.propagateArcConsistency([index]) == False:
+                return False
+        elif forwardCheck == True or inference == INFERENCE_FORWARD_CHECK:
+            for constraint in self.constraintsOf[index]:
+                if constraint.propagate(self, index, value) == False:
+                    return False
+        if rules:
+            return self.applyPropagationRules(rules, self.getAssignmentMark(variable, value))
+        return True
+
+    def reverseInferences(self, variable, value, forwardCheck=False, inference=INFERENCE_NONE):
+        if forwardCheck == True or inference != INFERENCE_NONE:
+            #Undo the domain prunings recorded after value was assigned to variable
+            mark = self.getAssignmentMark(variable, value)
+            if mark != None:
+                self.undoTo(mark + 1)
+
+    def getDecidedValue(self, index):
+        """Returns the value of an assigned variable or the only value left in the domain of an unassigned one"""
+        variable = self.variables[index]
+        if variable.isAssigned:
+            return variable.getValue()
+        return variable.getDomain()[0]
+
+    def propagateArcConsistency(self, queue=None):
+        """AC-3 over the constraints: revises the constraints of the variables in queue (positions, all the
+           constraints when None) and then the constraints of every variable whose domain it reduces, until nothing
+           changes. Prunings are recorded on the trail. Returns false if a domain was wiped out"""
+        if queue == None:
+            pending = deque(self.constraints)
+        else:
+            pending = deque(constraint for index in queue for constraint in self.constraintsOf[index])
+        queued = set(id(constraint) for constraint in pending)
+        while pending:
+            constraint = pending.popleft()
+            queued.discard(id(constraint))
+            mark = self.getTrailMark()
+            if constraint.revise(self) == False:
+                return False
+            for (kind, index, value) in self.trail[mark:]:
+                for other in self.constraintsOf[index]:
+                    if id(other) not in queued:
+                        queued.add(id(other))
+                        pending.append(other)
+        return True
+
+    def applyPropagationRules(self, rules, mark=None):
+        """Models with propagation rules (see SudokuCSP) override this"""
+        if rules:
+            raise ValueError('Unknown propagation rules: %s' % ', '.join(rules))
+        return True
+
+    def pruneValues(self, index, values):
+        """Removes several values from an unassigned variable. Returns false if its domain was wiped out"""
+        for value in values:
+            self.pruneValue(index, value)
+        return self.variables[index].getDomainSize() > 0
+
+    def getTrailMark(self):
+        """Returns a mark of the current trail position which can later be passed to undoTo"""
+        return len(self.trail)
+
+    def getAssignmentMark(self, variable, value):
+        """Returns the trail position of the assignment of value to variable or None if it is not on the trail"""
+        entry = (TRAIL_ASSIGN, self.getVariableIndex(variable), value)
+        for position in range(len(self.trail) - 1, -1, -1):
+            if self.trail[position] == entry:
+                return position
+        return None
+
+    def undoTo(self, mark):
+        """Rolls back the assignments and domain prunings recorded on the trail after mark"""
+        trail = self.trail
+        buckets = self.domainBuckets
+        while len(trail) > mark:
+            kind, index, value = trail.pop()
+            variable = self.variables[index]
+            if kind == TRAIL_ASSIGN:
+                variable.unAssign(value)
+                buckets[variable.getDomainSize()].add(index)
+            else:
+                variable.addToDomain(value)
+                if not variable.isAssigned:
+                    size = variable.getDomainSize()
+                    buckets[size - 1].discard(index)
+                    buckets[size].add(index)
+
+    def pruneValue(self, index, value):
+        """Removes value from the domain of the variable at position index and records it on the trail"""
+        variable = self.variables[index]
+        if variable.removeFromDomain(value):
+            self.trail.append((TRAIL_PRUNE, index, value))
+            if not variable.isAssigned:
+                size = variable.getDomainSize()
+                self.domainBuckets[size + 1].discard(index)
+                self.domainBuckets[size].add(index)
+            return True
+        return False
+
+    def getUnassignedCount(self):
+        """Returns the count of remaining unassigned variables"""
+        return sum(len(bucket) for bucket in self.domainBuckets)
+
+    def isAssignmentComplete(self):
+        #Assignment is complete when there are no more variables to assign
+        return self.getUnassignedCount() == 0
+
+    def isAllDiff(self, valuesList):
+        """Utility function for evaluating the AllDiff constraint. Returns true if all the values in valuesList are different"""
+        valuesList = list(filter(lambda value: value != '0', valuesList))
+        return len(valuesList) == len(set(valuesList))
+
+    def assign(self, variable, value):
+        """Assign value to the variable """
+        index = self.getVariableIndex(variable)
+        domainSize = variable.getDomainSize()
+        success = variable.assign(value)
+        if success:
+            self.assignmentCounter += 1
+            self.trail.append((TRAIL_ASSIGN, index, value))
+            self.domainBuckets[domainSize].discard(index)
+        return success
+
+    def unAssign(self, variable, value):
+        """For undoing the assignment of value to variable along with any changes recorded after it"""
+        mark = self.getAssignmentMark(variable, value)
+        if mark != None:
+            self.undoTo(mark)
+        elif variable.isAssigned:
+            variable.unAssign(value)
+            self.buildSelectionIndex()
+
+    def print(self, file=None):
+        for variable in self.variables:
+            print('%s = %s' % (variable.getName(), variable.getValue()), file=file)
+
+
+if __name__ == '__main__':
+    import backtrack
+
+    #Graph colouring: the states and territories of Australia with neighbours in different colours
+    colours = ['blue', 'green', 'red']
+    borders = [('WA', 'NT'), ('WA', 'SA'), ('NT', 'SA'), ('NT', 'Q'), ('SA', 'Q'), ('SA', 'NSW'), ('SA', 'V'), ('Q', 'NSW'), ('NSW', 'V')]
+    csp = CSP()
+    for region in ['WA', 'NT', 'SA', 'Q', 'NSW', 'V', 'T']:
+        csp.addVariable(region, colours)
+    for first, second in borders:
+        csp.addConstraint(TableConstraint(csp.indexOf[first], csp.indexOf[second], [(a, b) for a in colours for b in colours if a != b]))
+    csp.buildIndex()
+    result = backtrack.solve(csp, forwardCheck=True, mrvHeuristic=True, maxDegreeHeuristic=True, lcvHeuristic=True)
+    print('Map colouring %s in %d assignments' % (result.status, result.assignments))
+    csp.print()
+
+    #A Kakuro-like run: 4 different digits adding up to 30
+    csp = CSP()
+    cells = [csp.addVariable('x%d' % i, [str(d) for d in range(1, 10)]) for i in range(4)]
+    csp.addConstraint(AllDifferent(cells))
+    csp.addConstraint(SumConstraint(cells, 30))
+    csp.buildIndex()
+    print('Sums to 30: %d solutions' % backtrack.countSolutions(csp, inference=INFERENCE_AC3, mrvHeuristic=True)[0])
@@ -0,0 +1,225 @@
+from sudoku_csp import SudokuCSP, STANDARD_GEOMETRY
+from sudoku_grid import SudokuGrid
+from backtrack import STATUS_SOLVED, STATUS_UNSOLVED, STATUS_BUDGET_EXHAUSTED
+import time
+
+class DancingLinks:
+    """Exact cover solver using Knuth's Algorithm X with dancing links. The nodes live in flat integer arrays
+       instead of linked objects. Contains:
+       1. left, right, up, down - the links of every node. Node 0 is the root, nodes 1 to columnCount are the
+          column headers and the remaining nodes are the 1s of the matrix
+       2. column, rowId - the column header and the row identifier of every node
+       3. size - the number of nodes in each column
+       4. nodeCount - number of rows selected during the search
+       5. cutOff - the status the last search was stopped with by maxNodes or its budget (STATUS_BUDGET_EXHAUSTED
+          or STATUS_CANCELLED), None when it ran to the end
+    """
+
+    def __init__(self, columnCount):
+        self.columnCount = columnCount
+        self.left = [i - 1 for i in range(columnCount + 1)]
+        self.right = [i + 1 for i in range(columnCount + 1)]
+        self.left[0] = columnCount
+        self.right[columnCount] = 0
+        self.up = list(range(columnCount + 1))
+        self.down = list(range(columnCount + 1))
+        self.column = list(range(columnCount + 1))
+        self.rowId = [-1] * (columnCount + 1)
+        self.size = [0] * (columnCount + 1)
+        self.rowStart = {}
+        self.nodeCount = 0
+        self.cutOff = None
+
+    def addRow(self, rowId, columns):
+        """Adds a row with 1s in the given columns (numbered from 1 to columnCount)"""
+        first = len(self.column)
+        for c in columns:
+            node = len(self.column)
+            self.column.append(c)
+            self.rowId.append(rowId)
+            #Insert at the bottom of the column
+            self.up.append(self.up[c])
+            self.down.append(c)
+            self.down[self.up[c]] = node
+            self.up[c] = node
+            self.size[c] += 1
+            #Insert at the end of the row
+            self.left.append(node - 1 if node > first else node)
+            self.right.append(first)
+            if node > first:
+                self.right[node - 1] = node
+                self.left[first] = node
+        self.rowStart[rowId] = first
+
+    def copy(self):
+        """Returns an independent copy of the matrix"""
+        links = DancingLinks.__new__(DancingLinks)
+        links.columnCount = self.columnCount
+        for name in ('left', 'right', 'up', 'down', 'column', 'rowId', 'size'):
+            setattr(links, name, list(getattr(self, name)))
+        links.rowStart = self.rowStart
+        links.nodeCount = 0
+        links.cutOff = None
+        return links
+
+    def cover(self, c):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, c):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def selectRow(self, rowId):
+        """Puts a row in the solution up front (e.g. a given value). Returns false if it clashes with a row
+           already selected"""
+        first = self.rowStart[rowId]
+        node = first
+        while True:
+            c = self.column[node]
+            if self.right[self.left[c]] != c:
+                return False #the column is already covered
+            self.cover(c)
+            node = self.right[node]
+            if node == first:
+                return True
+
+    def search(self, solution, maxNodes=None, budget=None):
+        """Extends solution (a list of row identifiers) to an exact cover. Returns true when one is found. Loops
+           over an explicit stack of the row tried at each level, so the depth is not limited by the recursion
+           limit of Python (a 36x36 grid has up to 1296 levels). The search stops after maxNodes rows or when the
+           SearchBudget budget runs out (its maxAssignments counts the rows), see cutOff"""
+        left, right, down, column, size, rowId = self.left, self.right, self.down, self.column, self.size, self.rowId
+        stack = []
+        startTime = time.perf_counter()
+        while True:
+            if right[0] == 0:
+                return True
+            if maxNodes != None and self.nodeCount > maxNodes:
+                self.cutOff = STATUS_BUDGET_EXHAUSTED
+                return False
+            if budget != None:
+                self.cutOff = budget.getStopStatus(self.nodeCount, 0, time.perf_counter() - startTime)
+                if self.cutOff != None:
+                    return False
+
+            #Branch on the column with the fewest remaining rows
+            c = right[0]
+            best = c
+            while c != 0:
+                if size[c] < size[best]:
+                    best = c
+                c = right[c]
+            r = None
+            if size[best] > 0:
+                self.cover(best)
+                r = down[best]
+
+            #Dead end: go back to the deepest level that has a row left to try
+            while r == None:
+                if not stack:
+                    return False
+                r = stack.pop()
+                solution.pop()
+                j = left[r]
+                while j != r:
+                    self.uncover(column[j])
+                    j = left[j]
+                c = column[r]
+                r = down[r]
+                if r == c:
+                    self.uncover(c)
+                    r = None
+
+            self.nodeCount += 1
+            solution.append(rowId[r])
+            stack.append(r)
+            j = right[r]
+            while j != r:
+                self.cover(column[j])
+                j = right[j]
+
+
+#The matrix of an empty sudoku is built once per grid geometry and copied for every puzzle
+emptySudokuCovers = {}
+
+def buildSudokuCover(geometry=STANDARD_GEOMETRY):
+    """Returns the exact cover matrix of an empty sudoku (9X9 by default). With n = geometry.size, row
+       cell * n + digit - 1 places digit in cell and covers 4 of the 4 * n * n columns: the cell, and the digit in
+       the row, column and box of the cell"""
+    if geometry in emptySudokuCovers:
+        return emptySudokuCovers[geometry].copy()
+    size = geometry.size
+    cellCount = geometry.cellCount
+    links = DancingLinks(4 * cellCount)
+    for cell in range(cellCount):
+        for digit in range(1, size + 1):
+            links.addRow(cell * size + digit - 1, [1 + cell,
+                                                   1 + cellCount + geometry.cellRow[cell] * size + digit - 1,
+                                                   1 + 2 * cellCount + geometry.cellColumn[cell] * size + digit - 1,
+                                                   1 + 3 * cellCount + geometry.cellBox[cell] * size + digit - 1])
+    emptySudokuCovers[geometry] = links
+    return links.copy()
+
+
+def dlxSolve(csp, maxNodes=None, budget=None):
+    """Solves the sudoku loaded in csp as an exact cover problem and returns (values, status). The status is
+       STATUS_SOLVED, STATUS_UNSOLVED when there is no solution, or the status the search was cut off with after
+       maxNodes rows or when the SearchBudget budget ran out (see DancingLinks.search). The solution is left in csp and the rows selected by the search are added to its
+       assignment count. The csp is left unchanged when there is no solution"""
+    assignmentList = csp.getCurrentAssignment().split(',')
+    size = csp.geometry.size
+    links = buildSudokuCover(csp.geometry)
+    for cell in range(csp.geometry.cellCount):
+        if assignmentList[cell] != '0' and links.selectRow(cell * size + int(assignmentList[cell]) - 1) == False:
+            return assignmentList, STATUS_UNSOLVED
+
+    solution = []
+    found = links.search(solution, maxNodes, budget)
+    csp.assignmentCounter += links.nodeCount
+    if not found:
+        return assignmentList, links.cutOff if links.cutOff != None else STATUS_UNSOLVED
+    for rowId in solution:
+        assignmentList[rowId // size] = str(rowId % size + 1)
+    csp.reset(assignmentList)
+    return assignmentList, STATUS_SOLVED
+
+
+def dlxSearch(csp, maxNodes=None):
+    """Like backtrack.backtrackSearch, leaves the solution in csp and returns it as a list of values (see
+       dlxSolve)"""
+    return dlxSolve(csp, maxNodes)[0]
+
+
+if __name__ == '__main__':
+    inputFilePath = 'input-data/17/1.sd'
+    sudokuGrid = SudokuGrid(inputFilePath)
+    csp = SudokuCSP(compactDomains=True)
+    csp.reset(sudokuGrid.convert())
+    print(5*'=' + 'Question Sudoku' + 5*'=')
+    csp.print()
+
+    dlxSearch(csp)
+    print("\nFound a solution in %d nodes" % csp.getAssignmentCount())
+    print('\n\n' +5*'=' + 'Solved Sudoku' + 5*'=')
+    csp.print()
@@ -0,0 +1,171 @@
+from sudoku_csp import SudokuCSP
+from sudoku_grid import SudokuGrid
+from sudoku_runner import VERSION_OPTIONS
+from csp import INFERENCE_AC3
+import backtrack
+import argparse
+import multiprocessing
+import queue
+import os
+import time
+
+#Members of the default portfolio as (name, solve options, seed, restartBase). Members with a seed break the
+#ties of their heuristics at random and restart on the Luby schedule of restartBase backtracks, the others run
+#the deterministic search once. The list is in order of priority when there are fewer workers than members
+PORTFOLIO = [
+    ('v3', VERSION_OPTIONS['v3'], None, None),
+    ('rules', {'inference': INFERENCE_AC3, 'mrvHeuristic': True, 'maxDegreeHeuristic': True,
+               'hiddenSingles': True, 'nakedSubsets': True, 'lockedCandidates': True}, None, None),
+    ('v3-luby', VERSION_OPTIONS['v3'], 1, 50),
+    ('mac-luby', {'inference': INFERENCE_AC3, 'mrvHeuristic': True}, 2, 20),
+    ('fc-cbj-luby', {'forwardCheck': True, 'mrvHeuristic': True, 'backjumping': True, 'maxNogoods': 1000}, 3, 100),
+    ('v2-cbj', {'forwardCheck': True, 'backjumping': True, 'maxNogoods': 1000}, None, None),
+    ('v3-luby-2', VERSION_OPTIONS['v3'], 4, 200),
+    ('mac', {'inference': INFERENCE_AC3, 'mrvHeuristic': True, 'maxDegreeHeuristic': True, 'lcvHeuristic': True}, None, None),
+]
+
+
+def runMember(member, tasks, results, cancelEvent):
+    """Worker process: solves the puzzles of the tasks queue with one member of the portfolio until it gets None.
+       A task is (puzzle id, assignment list, boxHeight, boxWidth, maxAssignments, maxSeconds). Puts (puzzle id,
+       name, SearchResult) on the results queue for each. The search stops when the shared cancelEvent is set"""
+    name, options, seed, restartBase = member
+    while True:
+        task = tasks.get()
+        if task == None:
+            break
+        puzzleId, assignmentList, boxHeight, boxWidth, maxAssignments, maxSeconds = task
+        budget = backtrack.SearchBudget(maxAssignments=maxAssignments, maxSeconds=maxSeconds, cancelEvent=cancelEvent)
+        csp = SudokuCSP(compactDomains=True, boxHeight=boxHeight, boxWidth=boxWidth)
+        csp.reset(assignmentList)
+        if seed == None:
+            result = backtrack.solve(csp, budget=budget, **options)
+        else:
+            result = backtrack.solveWithRestarts(csp, budget=budget, seed=seed, restartBase=restartBase, **options)
+        results.put((puzzleId, name, result))
+
+
+class Portfolio:
+    """Races several search configurations on each puzzle, one long-lived process per member, so a puzzle only
+       costs the searches and not the start of the processes. Contains:
+       1. members - the (name, solve options, seed, restartBase) members that run, see PORTFOLIO
+       2. processes, tasks - the process of each member and the queue it reads its puzzles from
+       3. results - the queue the members put their (puzzle id, name, SearchResult) on
+       4. cancelEvent - set when a puzzle is decided to stop the other members. It is only cleared for the next
+          puzzle once every member has answered, so no search of the previous puzzle is left running
+       5. puzzleId, pending - the number of the current puzzle and how many members have not answered it yet.
+          Results of earlier puzzles are ignored
+    """
+
+    def __init__(self, members=PORTFOLIO, workers=None):
+        self.members = members[:workers] if workers != None else members
+        self.processes = []
+        self.tasks = []
+        self.results = None
+        self.cancelEvent = None
+        self.puzzleId = 0
+        self.pending = 0
+
+    def start(self):
+        #The event is shared by inheritance, it cannot be sent to a running process
+        self.cancelEvent = multiprocessing.Event()
+        self.results = multiprocessing.Queue()
+        self.tasks = [multiprocessing.Queue() for member in self.members]
+        self.processes = [multiprocessing.Process(target=runMember, args=(member, tasks, self.results, self.cancelEvent), daemon=True)
+                          for (member, tasks) in zip(self.members, self.tasks)]
+        for process in self.processes:
+            process.start()
+
+    def close(self):
+        if self.cancelEvent != None:
+            self.cancelEvent.set()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.tasks = []
+        self.pending = 0
+
+    def solve(self, assignmentList, maxSeconds=None, maxAssignments=None, boxHeight=3, boxWidth=3):
+        """Returns (name, SearchResult) of the first member to solve the puzzle or prove it has no solution, and
+           cancels the others. When every member runs out of budget the result of the last one is returned.
+           maxSeconds and maxAssignments limit each member"""
+        self.waitForMembers()
+        if not self.processes:
+            self.start()
+        self.puzzleId += 1
+        self.cancelEvent.clear()
+        for tasks in self.tasks:
+            tasks.put((self.puzzleId, assignmentList, boxHeight, boxWidth, maxAssignments, maxSeconds))
+        self.pending = len(self.processes)
+
+        winner = None
+        while self.pending > 0:
+            answer = self.getResult()
+            if answer == None:
+                break
+            name, result = answer
+            winner = (name, result)
+            if result.status == backtrack.STATUS_SOLVED or result.status == backtrack.STATUS_UNSOLVED:
+                #The cancelled members are waited for by the next puzzle, not by this one
+                self.cancelEvent.set()
+                break
+        return winner
+
+    def waitForMembers(self):
+        while self.pending > 0 and self.getResult() != None:
+            pass
+
+    def getResult(self):
+        """Returns (name, SearchResult) of the next member to answer the current puzzle. Returns None if a member
+           died, after stopping all of them. The next puzzle then starts new ones, with every member idle"""
+        while True:
+            try:
+                puzzleId, name, result = self.results.get(timeout=1)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    self.close()
+                    return None
+                continue
+            if puzzleId == self.puzzleId:
+                self.pending -= 1
+                return name, result
+
+
+def solvePortfolio(assignmentList, members=PORTFOLIO, workers=None, maxSeconds=None, maxAssignments=None, boxHeight=3, boxWidth=3):
+    """Races the members of the portfolio on one puzzle (the first workers members when workers is given), see
+       Portfolio.solve. The member processes are started and stopped for this puzzle only, which costs tens of
+       milliseconds: use a Portfolio to solve several puzzles, or a single search for easy ones"""
+    portfolio = Portfolio(members, workers)
+    try:
+        return portfolio.solve(assignmentList, maxSeconds, maxAssignments, boxHeight, boxWidth)
+    finally:
+        portfolio.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve puzzles by racing several search configurations, one process each')
+    parser.add_argument('inputFiles', nargs='+', help='.sd puzzle files')
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count(), len(PORTFOLIO)))
+    parser.add_argument('--max-seconds', type=float, default=None)
+    parser.add_argument('--max-assignments', type=int, default=None)
+    args = parser.parse_args()
+    #The members are started once for all the files
+    portfolio = Portfolio(workers=args.workers)
+    portfolio.start()
+    try:
+        for inputFile in args.inputFiles:
+            sudokuGrid = SudokuGrid(inputFile)
+            startTime = time.perf_counter()
+            winner = portfolio.solve(sudokuGrid.convert(), maxSeconds=args.max_seconds, maxAssignments=args.max_assignments,
+                                     boxHeight=sudokuGrid.boxHeight, boxWidth=sudokuGrid.boxWidth)
+            if winner == None:
+                print('%s: no member of the portfolio returned a result' % inputFile)
+                continue
+            name, result = winner
+            print('%s: %s by %s in %d assignments, %.3fs' % (inputFile, result.status, name, result.assignments, time.perf_counter() - startTime))
+    finally:
+        portfolio.close()
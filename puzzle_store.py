@@ -0,0 +1,127 @@
+import numpy as np
+import puzzle_stream
+import backtrack
+import argparse
+import concurrent.futures
+import os
+import struct
+
+#File header: magic, format version, bits per cell (8 or 4), cells per puzzle and number of puzzles. The puzzles
+#start at DATA_OFFSET, each one stored as 81 bytes or, packed, as 41 bytes of two cells per byte (high nibble first)
+MAGIC = b'SDKB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHBxHxxQ')
+DATA_OFFSET = 32
+CELLS = 81
+
+
+def getPuzzleSize(bitsPerCell):
+    return CELLS if bitsPerCell == 8 else (CELLS + 1) // 2
+
+
+def packCells(cells):
+    """Packs a (N, 81) array of digits into a (N, 41) array with two digits per byte"""
+    cells = np.concatenate([cells, np.zeros((len(cells), 1), dtype=np.uint8)], axis=1)
+    return (cells[:, 0::2] << 4) | cells[:, 1::2]
+
+
+def unpackCells(packed):
+    """Inverse of packCells"""
+    cells = np.empty((len(packed), packed.shape[1] * 2), dtype=np.uint8)
+    cells[:, 0::2] = packed >> 4
+    cells[:, 1::2] = packed & 0x0F
+    return cells[:, :CELLS]
+
+
+def writeStore(path, puzzles, packed=False, chunkSize=100000):
+    """Writes an iterable of assignment lists to a binary puzzle store and returns the number of puzzles"""
+    bitsPerCell = 4 if packed else 8
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, bitsPerCell, CELLS, 0).ljust(DATA_OFFSET, b'\0'))
+        chunk = []
+        for assignmentList in puzzles:
+            chunk.append([int(value) for value in assignmentList])
+            if len(chunk) == chunkSize:
+                count += writeChunk(f, chunk, packed)
+                chunk = []
+        count += writeChunk(f, chunk, packed)
+        #The number of puzzles is only known at the end
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, bitsPerCell, CELLS, count))
+    return count
+
+
+def writeChunk(f, chunk, packed):
+    if not chunk:
+        return 0
+    cells = np.array(chunk, dtype=np.uint8).reshape(-1, CELLS)
+    f.write((packCells(cells) if packed else cells).tobytes())
+    return len(cells)
+
+
+class PuzzleStore:
+    """Read-only view of a binary puzzle store. Contains:
+       1. count - the number of puzzles, bitsPerCell - 8 or 4 (packed)
+       2. data - (count, puzzle size) array memory-mapped from the file, so opening a store reads nothing but the
+          header and slicing it copies nothing
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, formatVersion, self.bitsPerCell, cells, self.count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or formatVersion != FORMAT_VERSION or cells != CELLS or self.bitsPerCell not in (4, 8):
+            raise ValueError("The format of input data is not correct")
+        if self.count == 0:
+            self.data = np.zeros((0, getPuzzleSize(self.bitsPerCell)), dtype=np.uint8)
+        else:
+            self.data = np.memmap(path, dtype=np.uint8, mode='r', offset=DATA_OFFSET, shape=(self.count, getPuzzleSize(self.bitsPerCell)))
+
+    def __len__(self):
+        return self.count
+
+    def getCells(self, start=0, stop=None):
+        """Returns the (n, 81) digits of puzzles start to stop. This is a view of the file for unpacked stores and
+           an unpacked copy for packed ones"""
+        rows = self.data[start:stop]
+        return rows if self.bitsPerCell == 8 else unpackCells(rows)
+
+    def getShare(self, worker, workers):
+        """Returns the (start, stop) range of the puzzles worker (numbered from 0) handles out of workers"""
+        return (self.count * worker // workers, self.count * (worker + 1) // workers)
+
+    def getPuzzle(self, index):
+        return [str(value) for value in self.getCells(index, index + 1)[0]]
+
+    def iterPuzzles(self, start=0, stop=None, chunkSize=10000):
+        """Yields the assignment lists of puzzles start to stop, unpacking chunkSize puzzles at a time"""
+        stop = self.count if stop == None else min(stop, self.count)
+        for chunkStart in range(start, stop, chunkSize):
+            for row in self.getCells(chunkStart, min(chunkStart + chunkSize, stop)):
+                yield [str(value) for value in row]
+
+
+def solveShare(path, worker, workers, version='v4'):
+    """Opens the store in a worker process, solves its share of the puzzles and returns the number solved"""
+    store = PuzzleStore(path)
+    start, stop = store.getShare(worker, workers)
+    results = puzzle_stream.solvePuzzles(store.iterPuzzles(start, stop), version)
+    return sum(1 for (status, assignments, solution) in results if status == backtrack.STATUS_SOLVED)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a dataset to a binary puzzle store and solve it in parallel')
+    parser.add_argument('storeFile')
+    parser.add_argument('--convert', metavar='SOURCE',
+                        help='first write the puzzles of SOURCE (a directory of .sd files or a one-puzzle-per-line file) to storeFile')
+    parser.add_argument('--packed', action='store_true', help='store two cells per byte')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--version', default='v4')
+    args = parser.parse_args()
+    if args.convert:
+        puzzles = puzzle_stream.readDataSet(args.convert) if os.path.isdir(args.convert) else puzzle_stream.readPuzzles(args.convert)
+        print('Wrote %d puzzles to %s' % (writeStore(args.storeFile, puzzles, packed=args.packed), args.storeFile))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(solveShare, args.storeFile, worker, args.workers, args.version) for worker in range(args.workers)]
+        print('Solved %d of %d puzzles' % (sum(future.result() for future in futures), len(PuzzleStore(args.storeFile))))
@@ -0,0 +1,126 @@
+from sudoku_csp import SudokuCSP
+from sudoku_grid import SudokuGrid
+from sudoku_runner import VERSION_OPTIONS
+from itertools import tee
+import backtrack
+import dlx
+import argparse
+import gzip
+import os
+
+#Characters accepted for an empty cell in the one-line format
+EMPTY_CELLS = '0.'
+#Characters accepted for a given value
+DIGITS = '123456789'
+
+#Columns of a results file, one tab separated line per solved puzzle
+RESULT_FIELDS = ['puzzle', 'version', 'status', 'assignments', 'solution']
+
+
+def openText(path, mode='r'):
+    """Opens a text file, gzip compressed when the name ends with .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def parseLine(line):
+    """Converts an 81 character puzzle line into an assignment list. Empty cells are '0' or '.'"""
+    line = line.strip()
+    if len(line) != 81 or any(c not in DIGITS and c not in EMPTY_CELLS for c in line):
+        raise ValueError("The format of input data is not correct")
+    return ['0' if c in EMPTY_CELLS else c for c in line]
+
+
+def formatLine(assignmentList):
+    return ''.join(str(value) for value in assignmentList)
+
+
+def readPuzzles(path):
+    """Yields the assignment list of every puzzle of a one-puzzle-per-line file. Blank lines and lines starting
+       with # are skipped. A line that is not a puzzle raises ValueError with its line number"""
+    with openText(path) as f:
+        for lineNumber, line in enumerate(f, 1):
+            if line.strip() and not line.startswith('#'):
+                try:
+                    assignmentList = parseLine(line)
+                except ValueError as e:
+                    raise ValueError('%s (%s line %d)' % (e, path, lineNumber))
+                yield assignmentList
+
+
+def writePuzzles(path, puzzles):
+    """Writes assignment lists to a one-puzzle-per-line file and returns how many were written"""
+    count = 0
+    with openText(path, 'w') as f:
+        for assignmentList in puzzles:
+            f.write(formatLine(assignmentList) + '\n')
+            count += 1
+    return count
+
+
+def readDataSet(inputRootDirectory):
+    """Yields the puzzles of a directory tree of .sd files, in the order of the runner"""
+    directories = [d for d in os.listdir(inputRootDirectory) if os.path.isdir(os.path.join(inputRootDirectory, d))]
+    directories.sort(key=lambda d: (0, int(d)) if d.isdigit() else (1, d))
+    for directory in directories:
+        for file in sorted(os.listdir(os.path.join(inputRootDirectory, directory))):
+            if file.endswith('.sd'):
+                yield SudokuGrid(os.path.join(inputRootDirectory, directory, file)).convert()
+
+
+def solvePuzzles(puzzles, version, budget=None):
+    """Yields (status, assignment count, solution) for each assignment list of puzzles as it is solved. v4 only
+       stops early when a budget is given, the other versions default to DEFAULT_MAX_ASSIGNMENTS assignments"""
+    for assignmentList in puzzles:
+        csp = SudokuCSP(compactDomains=True)
+        csp.reset(assignmentList)
+        if version == 'v4':
+            status = dlx.dlxSolve(csp, budget=budget)[1]
+        else:
+            if budget == None:
+                budget = backtrack.SearchBudget(maxAssignments=backtrack.DEFAULT_MAX_ASSIGNMENTS)
+            status = backtrack.solve(csp, budget=budget, **VERSION_OPTIONS[version]).status
+        yield status, csp.getAssignmentCount(), csp.getCurrentAssignment().split(',')
+
+
+def readResults(path):
+    """Yields the results of a results file as dicts with the RESULT_FIELDS"""
+    if not os.path.exists(path):
+        return
+    with openText(path) as f:
+        for line in f:
+            values = line.rstrip('\n').split('\t')
+            if len(values) == len(RESULT_FIELDS) and values[0] != RESULT_FIELDS[0]:
+                result = dict(zip(RESULT_FIELDS, values))
+                result['puzzle'] = int(result['puzzle'])
+                result['assignments'] = int(result['assignments'])
+                yield result
+
+
+def solveFile(inputFile, resultsFile, versions=('v3',), budget=None):
+    """Solves every puzzle of a one-puzzle-per-line file with each version and appends one line per puzzle to
+       resultsFile. Puzzles numbered from 0 in file order, so a run that was stopped continues where it left off"""
+    done = set((result['puzzle'], result['version']) for result in readResults(resultsFile))
+    writeHeader = not os.path.exists(resultsFile)
+    with openText(resultsFile, 'a') as f:
+        if writeHeader:
+            f.write('\t'.join(RESULT_FIELDS) + '\n')
+        for version in versions:
+            numbered, puzzles = tee((i, assignmentList) for (i, assignmentList) in enumerate(readPuzzles(inputFile))
+                                    if (i, version) not in done)
+            results = solvePuzzles((assignmentList for (i, assignmentList) in puzzles), version, budget)
+            for (i, assignmentList), (status, assignments, solution) in zip(numbered, results):
+                f.write('%d\t%s\t%s\t%d\t%s\n' % (i, version, status, assignments, formatLine(solution)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve a file with one 81 character puzzle per line (optionally gzip compressed)')
+    parser.add_argument('inputFile')
+    parser.add_argument('resultsFile', help='tab separated results, appended to when it exists')
+    parser.add_argument('--versions', nargs='+', default=['v3'])
+    parser.add_argument('--convert', metavar='DIRECTORY', help='first write the .sd puzzles of DIRECTORY to inputFile')
+    args = parser.parse_args()
+    if args.convert:
+        print('Wrote %d puzzles to %s' % (writePuzzles(args.inputFile, readDataSet(args.convert)), args.inputFile))
+    solveFile(args.inputFile, args.resultsFile, versions=args.versions)
@@ -1,5 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from results_index import ResultsIndex
 import os
 
 def plotResults(xValues, yValues, version):
@@ -34,6 +35,8 @@ def plotResults(xValues, yValues, version):
         plt.title('Standard backtracking with forward checking')
     elif version == 'v3':
         plt.title('Standard backtracking with forward checking and heuristics')
+    elif version == 'v4':
+        plt.title('Dancing links (Algorithm X)')
     plt.show()
 
 
@@ -45,26 +48,58 @@ def getResults(outputRootDirectory, version):
             x.append(int(directory))
             outputDirectory = os.path.join(outputRootDirectory, directory)
             y_sum = 0
+            puzzleCount = 0
             overshootCount = 0
+            cachedCount = 0
             for file in os.listdir(outputDirectory):
                 if file.endswith(".txt") and 'count_' + version in file:
                     fullFilePath = os.path.join(os.path.join(outputRootDirectory, directory), file)
+                    puzzleCount += 1
                     with open(fullFilePath, 'r') as f:
                         yValue = int(f.readline())
-                        if (yValue > 10000):
+                        #Older count files have no status line, the search was cut off after 10000 assignments
+                        status = f.readline().strip()
+                        #Puzzles answered from the solution cache were not searched
+                        if status == 'cached':
+                            cachedCount += 1
+                        elif status == 'budget-exhausted' or (status == '' and yValue > 10000):
                             overshootCount += 1
                             print('Crossed 10000 steps for # initial values ' + directory)
                         else: y_sum += yValue
-            if overshootCount > 5:
+            if overshootCount > (puzzleCount - cachedCount) / 2:
                 y.append(overshootCount * 10000)
             else:
-                y_avg = y_sum / (10 - overshootCount)
+                y_avg = y_sum / max(1, puzzleCount - overshootCount - cachedCount)
                 y.append(y_avg)
 
     return x,y
 
 
+def getIndexedResults(indexPath, version):
+    """Same as getResults from a results index. Only the results added since the last call are read, the
+       averages come from the aggregates of the index"""
+    index = ResultsIndex(indexPath)
+    index.update()
+    x = []
+    y = []
+    for entry in index.getSummary(version):
+        x.append(entry['clues'])
+        print('%d initial values: median %s, p90 %s, p99 %s, cutoff rate %.2f' %
+              (entry['clues'], entry['median'], entry['p90'], entry['p99'], entry['cutoffRate']))
+        if entry['cutoffs'] > (entry['puzzles'] - entry['cached']) / 2:
+            y.append(entry['cutoffs'] * 10000)
+        else:
+            y.append(entry['mean'] if entry['mean'] != None else 0)
+    index.close()
+    return x,y
+
+
 if __name__ == '__main__':
     version = 'v3'
-    xs,ys = getResults('/Users/apple/Documents/git-repos/sudoku/Run2/constraint-satisfaction-problem-solver/output-data', version)
+    outputRootDirectory = '/Users/apple/Documents/git-repos/sudoku/Run2/constraint-satisfaction-problem-solver/output-data'
+    indexPath = os.path.join(outputRootDirectory, 'results.sqlite')
+    if os.path.exists(indexPath):
+        xs,ys = getIndexedResults(indexPath, version)
+    else:
+        xs,ys = getResults(outputRootDirectory, version)
     plotResults(xs, ys, version)
@@ -0,0 +1,180 @@
+import backtrack
+import argparse
+import os
+import sqlite3
+
+#Statuses of the searches that were cut off by their budget
+CUTOFF_STATUSES = (backtrack.STATUS_BUDGET_EXHAUSTED, backtrack.STATUS_CANCELLED)
+#Status of the puzzles answered from the solution cache, which are left out of the aggregates
+STATUS_CACHED = 'cached'
+#Percentiles reported by getSummary
+PERCENTILES = (90, 99)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    puzzle TEXT NOT NULL,
+    version TEXT NOT NULL,
+    clues INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    assignments INTEGER NOT NULL,
+    seconds REAL,
+    UNIQUE (puzzle, version)
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    version TEXT NOT NULL,
+    clues INTEGER NOT NULL,
+    puzzles INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    cutoffs INTEGER NOT NULL DEFAULT 0,
+    assignmentSum INTEGER NOT NULL DEFAULT 0,
+    timedCount INTEGER NOT NULL DEFAULT 0,
+    secondsSum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (version, clues)
+);
+CREATE TABLE IF NOT EXISTS assignmentCounts (
+    version TEXT NOT NULL,
+    clues INTEGER NOT NULL,
+    assignments INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (version, clues, assignments)
+);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+
+class ResultsIndex:
+    """SQLite store of the results of the runner, with per version and clue count aggregates. Contains:
+       1. results - one row per (puzzle, version), appended by add(). The first result of a puzzle is kept
+       2. aggregates - puzzle, cached and cutoff counts and the assignment and time sums of each version and clue
+          count, over the searches that were not cut off or cached
+       3. assignmentCounts - how many of those searches took each number of assignments, from which the median
+          and the percentiles are read without loading the results
+       4. state - the id of the last result added to the aggregates, so update() only reads the new rows
+    """
+
+    def __init__(self, path):
+        self.path = path
+        #Several runner processes can write at the same time, waiting for each other's locks
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, puzzle, version, clues, status, assignments, seconds=None):
+        with self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO results (puzzle, version, clues, status, assignments, seconds) VALUES (?, ?, ?, ?, ?, ?)',
+                                    (puzzle, version, clues, status, assignments, seconds))
+
+    def importCountFiles(self, outputRootDirectory):
+        """Adds the results of the count files of an output directory written before the index existed. Returns
+           the number of count files read"""
+        count = 0
+        rows = []
+        for directory in sorted(os.listdir(outputRootDirectory)):
+            outputDirectory = os.path.join(outputRootDirectory, directory)
+            if not os.path.isdir(outputDirectory) or not directory.isdigit():
+                continue
+            for file in sorted(os.listdir(outputDirectory)):
+                if not file.endswith('.txt') or '_count_' not in file:
+                    continue
+                name, version = os.path.splitext(file)[0].split('_count_')
+                with open(os.path.join(outputDirectory, file), 'r') as f:
+                    assignments = int(f.readline())
+                    status = f.readline().strip()
+                #Older count files have no status line, the search was cut off after 10000 assignments
+                if status == '':
+                    status = backtrack.STATUS_BUDGET_EXHAUSTED if assignments > backtrack.DEFAULT_MAX_ASSIGNMENTS else backtrack.STATUS_SOLVED
+                rows.append((directory + '/' + name + '.sd', version, int(directory), status, assignments))
+                count += 1
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO results (puzzle, version, clues, status, assignments) VALUES (?, ?, ?, ?, ?)', rows)
+        return count
+
+    def update(self):
+        """Adds the results recorded since the last update to the aggregates and returns how many there were"""
+        with self.connection:
+            #Take the write lock before reading the state, so that two processes updating at the same time cannot
+            #both read the same last id and add the new rows twice
+            self.connection.execute('BEGIN IMMEDIATE')
+            row = self.connection.execute("SELECT value FROM state WHERE name = 'aggregatedId'").fetchone()
+            lastId = row[0] if row != None else 0
+            rows = self.connection.execute('SELECT id, version, clues, status, assignments, seconds FROM results WHERE id > ? ORDER BY id',
+                                           (lastId,)).fetchall()
+            for id, version, clues, status, assignments, seconds in rows:
+                cached = status == STATUS_CACHED
+                cutoff = status in CUTOFF_STATUSES
+                searched = not cached and not cutoff
+                self.connection.execute('INSERT OR IGNORE INTO aggregates (version, clues) VALUES (?, ?)', (version, clues))
+                self.connection.execute('''UPDATE aggregates SET puzzles = puzzles + 1, cached = cached + ?, cutoffs = cutoffs + ?,
+                                           assignmentSum = assignmentSum + ?, timedCount = timedCount + ?, secondsSum = secondsSum + ?
+                                           WHERE version = ? AND clues = ?''',
+                                        (int(cached), int(cutoff), assignments if searched else 0, int(searched and seconds != None),
+                                         seconds if searched and seconds != None else 0, version, clues))
+                if searched:
+                    self.connection.execute('INSERT OR IGNORE INTO assignmentCounts VALUES (?, ?, ?, 0)', (version, clues, assignments))
+                    self.connection.execute('UPDATE assignmentCounts SET count = count + 1 WHERE version = ? AND clues = ? AND assignments = ?',
+                                            (version, clues, assignments))
+            if rows:
+                self.connection.execute("INSERT OR REPLACE INTO state VALUES ('aggregatedId', ?)", (rows[-1][0],))
+        return len(rows)
+
+    def getPercentiles(self, version, clues, percentiles):
+        """Nearest-rank percentiles of the assignment counts of the searches that were not cut off or cached"""
+        counts = self.connection.execute('SELECT assignments, count FROM assignmentCounts WHERE version = ? AND clues = ? ORDER BY assignments',
+                                         (version, clues)).fetchall()
+        total = sum(count for (assignments, count) in counts)
+        values = []
+        for percentile in percentiles:
+            rank = max(1, -(-percentile * total // 100))
+            seen = 0
+            value = None
+            for assignments, count in counts:
+                seen += count
+                if seen >= rank:
+                    value = assignments
+                    break
+            values.append(value)
+        return values
+
+    def getSummary(self, version):
+        """Returns a dict per clue count, in order, with the puzzles, cached and cutoffs counts, the cutoff rate
+           of the searched puzzles and the mean, median, percentiles and mean seconds of the searches that were
+           not cut off. Call update() first to include the latest results"""
+        summary = []
+        rows = self.connection.execute('SELECT clues, puzzles, cached, cutoffs, assignmentSum, timedCount, secondsSum FROM aggregates WHERE version = ? ORDER BY clues',
+                                       (version,)).fetchall()
+        for clues, puzzles, cached, cutoffs, assignmentSum, timedCount, secondsSum in rows:
+            completed = puzzles - cached - cutoffs
+            percentiles = self.getPercentiles(version, clues, (50,) + PERCENTILES)
+            entry = {'clues': clues, 'puzzles': puzzles, 'cached': cached, 'cutoffs': cutoffs,
+                     'cutoffRate': cutoffs / (puzzles - cached) if puzzles > cached else 0.0,
+                     'mean': assignmentSum / completed if completed > 0 else None,
+                     'median': percentiles[0],
+                     'seconds': secondsSum / timedCount if timedCount > 0 else None}
+            for percentile, value in zip(PERCENTILES, percentiles[1:]):
+                entry['p%d' % percentile] = value
+            summary.append(entry)
+        return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update and print the aggregates of a results index')
+    parser.add_argument('indexFile')
+    parser.add_argument('--import', dest='importDirectory', metavar='DIRECTORY', help='first add the count files of an output directory')
+    parser.add_argument('--versions', nargs='+', default=['v1', 'v2', 'v3', 'v4'])
+    args = parser.parse_args()
+    index = ResultsIndex(args.indexFile)
+    if args.importDirectory:
+        print('Read %d count files' % index.importCountFiles(args.importDirectory))
+    print('Aggregated %d new results' % index.update())
+    for version in args.versions:
+        for entry in index.getSummary(version):
+            print('%s %3d clues: %d puzzles, %d cached, cutoff rate %.2f, mean %s, median %s, p90 %s, p99 %s' %
+                  (version, entry['clues'], entry['puzzles'], entry['cached'], entry['cutoffRate'],
+                   '%.1f' % entry['mean'] if entry['mean'] != None else '-', entry['median'], entry['p90'], entry['p99']))
+    index.close()
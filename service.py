@@ -0,0 +1,253 @@
+from sudoku_runner import VERSION_OPTIONS
+import puzzle_stream
+import backtrack
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import time
+
+#Line protocol: a client sends one puzzle per line as an 81 character line (see puzzle_stream.parseLine),
+#optionally preceded by a version and a space. The service answers every line, in order, with
+#'status assignments solution' (the solution as an 81 character line, '-' when there is none) or 'error message'
+DEFAULT_PORT = 8765
+DEFAULT_VERSION = 'v3'
+VERSIONS = list(VERSION_OPTIONS) + ['v4']
+
+#Status of the requests that were not answered by the solver in time, and of the ones that failed
+STATUS_TIMEOUT = 'timeout'
+STATUS_ERROR = 'error'
+
+#Extra time given to a batch that is already running before a request waiting for it times out
+TIMEOUT_GRACE = 0.5
+
+#Empty puzzle solved by every worker when it starts, so the first real request does not pay for the imports
+WARM_UP_PUZZLE = ['0'] * 81
+
+
+def warmUp():
+    solveBatch([(WARM_UP_PUZZLE, DEFAULT_VERSION, None)])
+
+
+def solveBatch(requests):
+    """Worker process: solves a batch of (assignment list, version, seconds left) requests in turn and returns a
+       (status, assignments, solution) tuple for each. The search of a request stops when its time is up (the
+       dancing links of v4 included). A request that fails gets (STATUS_ERROR, 0, message) without failing the
+       others of the batch"""
+    startTime = time.monotonic()
+    results = []
+    for assignmentList, version, seconds in requests:
+        budget = None
+        if seconds != None:
+            seconds -= time.monotonic() - startTime
+            if seconds <= 0:
+                results.append((STATUS_TIMEOUT, 0, None))
+                continue
+            budget = backtrack.SearchBudget(maxSeconds=seconds)
+        try:
+            for status, assignments, solution in puzzle_stream.solvePuzzles([assignmentList], version, budget):
+                results.append((status, assignments, solution if status == backtrack.STATUS_SOLVED else None))
+        except Exception as e:
+            results.append((STATUS_ERROR, 0, str(e)))
+    return results
+
+
+class SolverService:
+    """asyncio solving service in front of a warm process pool. Contains:
+       1. executor - ProcessPoolExecutor whose workers are started and warmed up by start()
+       2. pending - bounded queue of the requests waiting to be batched. When it is full the connections stop
+          being read, so a client sending faster than the pool solves is slowed down by TCP (backpressure)
+       3. batchSize, batchDelay - a batch is sent to the pool when it has batchSize requests or batchDelay seconds
+          after its first request. slots limits the batches in the pool to two per worker
+       4. timeout - default seconds a request may take, from the moment it is read
+    """
+
+    def __init__(self, workers=None, batchSize=16, batchDelay=0.005, maxPending=256, timeout=10.0):
+        self.workers = workers if workers != None else os.cpu_count()
+        self.batchSize = batchSize
+        self.batchDelay = batchDelay
+        self.maxPending = maxPending
+        self.timeout = timeout
+        self.executor = None
+        self.pending = None
+        self.slots = None
+        self.tasks = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.pending = asyncio.Queue(maxsize=self.maxPending)
+        self.slots = asyncio.Semaphore(2 * self.workers)
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=warmUp)
+        #One job per worker makes the pool start all of them now
+        await asyncio.gather(*[loop.run_in_executor(self.executor, time.sleep, 0.1) for worker in range(self.workers)])
+        self.startTask(self.runBatcher())
+
+    def startTask(self, coroutine):
+        #Keep a reference to the task until it is done so that it is not garbage collected
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.executor != None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def enqueue(self, assignmentList, version=DEFAULT_VERSION, timeout=None):
+        """Queues a request, waiting while the queue is full. Returns (future of the result, deadline)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if timeout != None else self.timeout)
+        future = loop.create_future()
+        await self.pending.put((assignmentList, version, deadline, future))
+        return future, deadline
+
+    async def getResult(self, future, deadline):
+        """Waits for the (status, assignments, solution) of a queued request, at most until its deadline"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(0, deadline - asyncio.get_running_loop().time()) + TIMEOUT_GRACE)
+        except asyncio.TimeoutError:
+            return (STATUS_TIMEOUT, 0, None)
+
+    async def solve(self, assignmentList, version=DEFAULT_VERSION, timeout=None):
+        future, deadline = await self.enqueue(assignmentList, version, timeout)
+        return await self.getResult(future, deadline)
+
+    async def runBatcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            batchEnd = loop.time() + self.batchDelay
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), max(0, batchEnd - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            self.startTask(self.dispatch(batch))
+
+    async def dispatch(self, batch):
+        """Solves a batch in the pool and sets the results of its requests. Requests already past their deadline
+           are not sent"""
+        loop = asyncio.get_running_loop()
+        try:
+            now = loop.time()
+            requests = []
+            for assignmentList, version, deadline, future in batch:
+                if deadline <= now:
+                    setResult(future, (STATUS_TIMEOUT, 0, None))
+                else:
+                    requests.append((assignmentList, version, deadline, future))
+            if not requests:
+                return
+            try:
+                results = await loop.run_in_executor(self.executor, solveBatch,
+                                                     [(assignmentList, version, deadline - now) for (assignmentList, version, deadline, future) in requests])
+            except Exception as e:
+                results = [(STATUS_ERROR, 0, str(e))] * len(requests)
+            for (assignmentList, version, deadline, future), result in zip(requests, results):
+                setResult(future, result)
+        finally:
+            self.slots.release()
+
+    async def handleClient(self, reader, writer):
+        """Serves one connection. Lines are read and queued as fast as the pending queue allows while a second
+           task writes the answers back in the order of the requests"""
+        answers = asyncio.Queue()
+        writerTask = asyncio.get_running_loop().create_task(self.writeAnswers(answers, writer))
+        try:
+            async for line in reader:
+                line = line.decode().strip()
+                if not line:
+                    continue
+                parts = line.split()
+                version = parts[0] if len(parts) == 2 else DEFAULT_VERSION
+                try:
+                    if version not in VERSIONS:
+                        raise ValueError("Unknown version %s" % version)
+                    assignmentList = puzzle_stream.parseLine(parts[-1])
+                except ValueError as e:
+                    await answers.put(str(e))
+                    continue
+                await answers.put(await self.enqueue(assignmentList, version))
+        finally:
+            await answers.put(None)
+            await writerTask
+            writer.close()
+
+    async def writeAnswers(self, answers, writer):
+        while True:
+            answer = await answers.get()
+            if answer == None:
+                break
+            if isinstance(answer, str):
+                writer.write(('%s %s\n' % (STATUS_ERROR, answer)).encode())
+            else:
+                status, assignments, solution = await self.getResult(*answer)
+                if status == STATUS_ERROR:
+                    writer.write(('%s %s\n' % (STATUS_ERROR, solution)).encode())
+                else:
+                    writer.write(('%s %d %s\n' % (status, assignments, puzzle_stream.formatLine(solution) if solution != None else '-')).encode())
+            await writer.drain()
+
+
+def setResult(future, result):
+    #The request may have timed out and been answered already
+    if not future.done():
+        future.set_result(result)
+
+
+async def serve(service, host='127.0.0.1', port=DEFAULT_PORT, unixPath=None):
+    await service.start()
+    if unixPath != None:
+        server = await asyncio.start_unix_server(service.handleClient, path=unixPath)
+    else:
+        server = await asyncio.start_server(service.handleClient, host, port)
+    print('Serving on %s with %d workers' % (unixPath or '%s:%d' % (host, port), service.workers))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+async def solveRemote(puzzles, version=DEFAULT_VERSION, host='127.0.0.1', port=DEFAULT_PORT, unixPath=None):
+    """Client: sends assignment lists to a running service and returns its answer lines, in order"""
+    if unixPath != None:
+        reader, writer = await asyncio.open_unix_connection(unixPath)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    async def send():
+        for assignmentList in puzzles:
+            writer.write(('%s %s\n' % (version, puzzle_stream.formatLine(assignmentList))).encode())
+            await writer.drain()
+
+    #Sending and reading at the same time, a client sending everything first could block on the backpressure
+    sender = asyncio.get_running_loop().create_task(send())
+    answers = [(await reader.readline()).decode().strip() for assignmentList in puzzles]
+    await sender
+    writer.close()
+    return answers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sudoku solving service, or a client of it with --solve')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='listen on (or connect to) a Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--batch-delay', type=float, default=0.005, help='seconds to wait for a batch to fill')
+    parser.add_argument('--max-pending', type=int, default=256, help='queued requests before clients are slowed down')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds per request')
+    parser.add_argument('--solve', metavar='FILE', help='send the puzzles of a one-puzzle-per-line file to a running service')
+    parser.add_argument('--version', default=DEFAULT_VERSION)
+    args = parser.parse_args()
+    if args.solve:
+        for answer in asyncio.run(solveRemote(list(puzzle_stream.readPuzzles(args.solve)), args.version, args.host, args.port, args.unix)):
+            print(answer)
+    else:
+        service = SolverService(workers=args.workers, batchSize=args.batch_size, batchDelay=args.batch_delay,
+                                maxPending=args.max_pending, timeout=args.timeout)
+        asyncio.run(serve(service, args.host, args.port, args.unix))
@@ -0,0 +1,192 @@
+from sudoku_grid import SudokuGrid
+from collections import OrderedDict
+from itertools import permutations, product, islice
+import shelve
+
+#Default limit on the number of row and column orders tried when the invariants of a grid leave ties
+MAX_CANDIDATES = 2000
+
+
+class GridTransform:
+    """A symmetry of the sudoku grid. Contains:
+       1. transpose - true if rows and columns are swapped first
+       2. rowOrder, columnOrder - row i of the transformed grid is row rowOrder[i] of the (transposed) grid, and
+          the same for columns. Both keep the bands and stacks together
+       3. relabel - maps each digit of the grid to its digit in the transformed grid ('0' maps to '0')
+    """
+
+    def __init__(self, transpose, rowOrder, columnOrder, relabel):
+        self.transpose = transpose
+        self.rowOrder = rowOrder
+        self.columnOrder = columnOrder
+        self.relabel = relabel
+
+    def getSourceCells(self):
+        """Position in the original grid of each cell of the transformed grid"""
+        cells = []
+        for row in self.rowOrder:
+            for column in self.columnOrder:
+                cells.append(column * 9 + row if self.transpose else row * 9 + column)
+        return cells
+
+    def apply(self, assignmentList):
+        """Returns the transformed assignment list"""
+        return [self.relabel[assignmentList[cell]] for cell in self.getSourceCells()]
+
+    def invert(self, assignmentList):
+        """Maps an assignment list of the transformed grid back to the original grid"""
+        inverseRelabel = {value: digit for (digit, value) in self.relabel.items()}
+        original = ['0'] * 81
+        for position, cell in enumerate(self.getSourceCells()):
+            original[cell] = inverseRelabel[assignmentList[position]]
+        return original
+
+
+def getGroupOrders(signatures, maxCandidates):
+    """Returns up to maxCandidates orders of the 9 rows (or columns) of a grid that sort the bands and the rows
+       inside each band by their signatures. Rows or bands with equal signatures can go in any order, so all
+       the orders of the ties are listed"""
+    bands = [sorted(range(3 * band, 3 * band + 3), key=lambda row: signatures[row]) for band in range(3)]
+    bandSignatures = [tuple(signatures[row] for row in rows) for rows in bands]
+
+    def tiedOrders(items, key):
+        #All the orders of items sorted by key, with ties permuted
+        groups = []
+        for item in sorted(items, key=key):
+            if groups and key(groups[-1][0]) == key(item):
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+        return [sum(order, []) for order in product(*[[list(p) for p in permutations(group)] for group in groups])]
+
+    choices = [tiedOrders(range(3), lambda band: bandSignatures[band])]
+    choices += [tiedOrders(bands[band], lambda row: signatures[row]) for band in range(3)]
+    orders = []
+    for bandOrder, *rowOrders in islice(product(*choices), maxCandidates):
+        orders.append(tuple(row for band in bandOrder for row in rowOrders[band]))
+    return orders
+
+
+def canonicalize(assignmentList, maxCandidates=MAX_CANDIDATES):
+    """Returns (key, transform): the canonical form of a grid as an 81 character string and the GridTransform
+       mapping the grid to it. Grids that are the same up to digit relabelling, row and column swaps inside bands
+       and stacks, band and stack swaps and transposition get the same key, unless their invariants leave more
+       than maxCandidates tied orders to try, in which case some equivalent grids may get different keys. The key
+       is always a transform of the grid, so a solution of it maps back to a solution of the grid"""
+    assignmentList = [str(value) for value in assignmentList]
+    best = None
+    for transpose in (False, True):
+        grid = [[assignmentList[column * 9 + row if transpose else row * 9 + column] for column in range(9)] for row in range(9)]
+        #Invariants of the rows and columns under the symmetries: the clue count, and for each clue the clue
+        #count of the crossing line and how often its digit occurs
+        digitCounts = {}
+        for value in assignmentList:
+            digitCounts[value] = digitCounts.get(value, 0) + 1
+        rowCounts = [sum(1 for value in grid[row] if value != '0') for row in range(9)]
+        columnCounts = [sum(1 for row in range(9) if grid[row][column] != '0') for column in range(9)]
+        rowSignatures = [(rowCounts[row], sorted((columnCounts[column], digitCounts[grid[row][column]])
+                                                 for column in range(9) if grid[row][column] != '0')) for row in range(9)]
+        columnSignatures = [(columnCounts[column], sorted((rowCounts[row], digitCounts[grid[row][column]])
+                                                          for row in range(9) if grid[row][column] != '0')) for column in range(9)]
+
+        rowOrders = getGroupOrders(rowSignatures, maxCandidates)
+        columnOrders = getGroupOrders(columnSignatures, max(1, maxCandidates // len(rowOrders)))
+        for rowOrder in rowOrders:
+            for columnOrder in columnOrders:
+                #Digits are relabelled in order of first appearance
+                relabel = {'0': '0'}
+                key = []
+                for row in rowOrder:
+                    for column in columnOrder:
+                        value = grid[row][column]
+                        if value not in relabel:
+                            relabel[value] = str(len(relabel))
+                        key.append(relabel[value])
+                key = ''.join(key)
+                if best == None or key < best[0]:
+                    best = (key, transpose, rowOrder, columnOrder, relabel)
+
+    key, transpose, rowOrder, columnOrder, relabel = best
+    #Digits missing from the grid get the remaining labels so that a full solution can be mapped too
+    missing = [digit for digit in '123456789' if digit not in relabel]
+    for digit in missing:
+        relabel[digit] = str(len(relabel))
+    return key, GridTransform(transpose, rowOrder, columnOrder, relabel)
+
+
+class SolutionCache:
+    """Cache of sudoku solutions keyed by the canonical form of the puzzle, so a puzzle that is a symmetry of one
+       solved before is answered without search. Contains:
+       1. entries - OrderedDict from canonical key to the canonical solution, least recently used first. A key
+          made with a scope (e.g. the solver version) starts with it, so entries of other scopes are not returned
+       2. maxSize - the number of entries kept in memory
+       3. store - optional shelve file keeping every entry on disk, read when an entry is not in memory
+       4. hits, misses - lookup counts
+    """
+
+    def __init__(self, maxSize=10000, storePath=None, maxCandidates=MAX_CANDIDATES):
+        self.entries = OrderedDict()
+        self.maxSize = maxSize
+        self.maxCandidates = maxCandidates
+        self.store = shelve.open(storePath) if storePath != None else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, assignmentList, scope=None):
+        """Returns the solution of the puzzle as an assignment list, or None if no equivalent puzzle is cached
+           (in scope when one is given)"""
+        key, transform = self.getKey(assignmentList, scope)
+        solution = self.entries.get(key)
+        if solution != None:
+            self.entries.move_to_end(key)
+        elif self.store != None and key in self.store:
+            solution = self.store[key]
+            self.remember(key, solution)
+        if solution == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return transform.invert(list(solution))
+
+    def put(self, assignmentList, solutionList, scope=None):
+        """Caches solutionList as the solution of the puzzle assignmentList"""
+        key, transform = self.getKey(assignmentList, scope)
+        solution = ''.join(transform.apply([str(value) for value in solutionList]))
+        self.remember(key, solution)
+        if self.store != None:
+            self.store[key] = solution
+
+    def getKey(self, assignmentList, scope):
+        key, transform = canonicalize(assignmentList, self.maxCandidates)
+        if scope != None:
+            key = scope + ':' + key
+        return key, transform
+
+    def remember(self, key, solution):
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        if self.store != None:
+            self.store.close()
+            self.store = None
+
+
+if __name__ == '__main__':
+    from sudoku_csp import SudokuCSP
+    import dlx
+    assignmentList = SudokuGrid('input-data/17/1.sd').convert()
+    csp = SudokuCSP(compactDomains=True)
+    csp.reset(assignmentList)
+    cache = SolutionCache()
+    cache.put(assignmentList, dlx.dlxSearch(csp))
+
+    #A transposed copy of the puzzle with the digits 1 and 2 swapped is answered from the cache
+    swap = {'1': '2', '2': '1'}
+    equivalent = [swap.get(assignmentList[column * 9 + row], assignmentList[column * 9 + row]) for row in range(9) for column in range(9)]
+    solution = cache.get(equivalent)
+    csp.reset(solution)
+    print('cache hits %d, misses %d, solution valid: %s' % (cache.hits, cache.misses, csp.isAssignmentComplete()))
+    csp.print()
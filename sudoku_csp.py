@@ -1,251 +1,463 @@
-from variable import Variable
+from variable import Variable, BitmaskVariable, WideBitmaskVariable, BIT_OF
+from csp import CSP, AllDifferent, INFERENCE_NONE, INFERENCE_FORWARD_CHECK, INFERENCE_AC3, TRAIL_ASSIGN, TRAIL_PRUNE
 from sudoku_grid import SudokuGrid
-import math
+from collections import deque
+from itertools import combinations
 
-class SudokuCSP():
-    """Class representing Sudoku as a Constraint Satisfaction Problem. Includes utility functions for CSP operations. Contains:
-       1. variables - a list of 81 variables (type Variable) of the Sudoku CSP
+class SudokuGeometry:
+    """Static constraint structure of a grid of boxHeight X boxWidth boxes, with size = boxHeight * boxWidth rows,
+       columns, boxes and digits. Cells are indexed 0 to cellCount - 1 (variable name - 1). Contains:
+       1. rowUnits, columnUnits, boxUnits, units - the cells of every unit
+       2. cellRow, cellColumn, cellBox - the row, column and box each cell belongs to
+       3. cellUnits - the positions in units of the 3 units of each cell
+       4. rowPeers, columnPeers, boxPeers, peers - neighbours of each cell (excluding the cell itself) in ascending order
+       5. cellCounters - the unit and box segment counters of each cell (see below), counterCount - their number
+       6. digits - the cell values '1' to str(size)
+    """
+
+    def __init__(self, boxHeight=3, boxWidth=3):
+        size = boxHeight * boxWidth
+        self.boxHeight = boxHeight
+        self.boxWidth = boxWidth
+        self.size = size
+        self.cellCount = size * size
+        cells = range(self.cellCount)
+
+        self.rowUnits = [[row * size + col for col in range(size)] for row in range(size)]
+        self.columnUnits = [[row * size + col for row in range(size)] for col in range(size)]
+        self.boxUnits = [[(boxRow + r) * size + boxCol + c for r in range(boxHeight) for c in range(boxWidth)]
+                         for boxRow in range(0, size, boxHeight) for boxCol in range(0, size, boxWidth)]
+        self.units = self.rowUnits + self.columnUnits + self.boxUnits
+
+        self.cellRow = [i // size for i in cells]
+        self.cellColumn = [i % size for i in cells]
+        self.cellBox = [(self.cellRow[i] // boxHeight) * boxHeight + self.cellColumn[i] // boxWidth for i in cells]
+        self.cellUnits = [(self.cellRow[i], size + self.cellColumn[i], 2 * size + self.cellBox[i]) for i in cells]
+
+        self.rowPeers = [[j for j in self.rowUnits[self.cellRow[i]] if j != i] for i in cells]
+        self.columnPeers = [[j for j in self.columnUnits[self.cellColumn[i]] if j != i] for i in cells]
+        self.boxPeers = [[j for j in self.boxUnits[self.cellBox[i]] if j != i] for i in cells]
+        self.peers = [sorted(set(self.rowPeers[i] + self.columnPeers[i] + self.boxPeers[i])) for i in cells]
+
+        #Unassigned cells are counted per unit and per row and column segment of a box (the part of a row or
+        #column inside one box). The unassigned neighbours of a cell are then row + column + box - row segment -
+        #column segment (- 1 for the cell itself). The same holds when only counting the cells with a given value
+        #in their domain
+        rowSegments = size * boxHeight #each row crosses boxHeight boxes
+        columnSegments = size * boxWidth
+        self.cellCounters = [(self.cellRow[i], size + self.cellColumn[i], 2 * size + self.cellBox[i],
+                              3 * size + self.cellRow[i] * boxHeight + self.cellColumn[i] // boxWidth,
+                              3 * size + rowSegments + self.cellColumn[i] * boxWidth + self.cellRow[i] // boxHeight)
+                             for i in cells]
+        self.counterCount = 3 * size + rowSegments + columnSegments
+
+        self.digits = tuple(str(d) for d in range(1, size + 1))
+
+
+#Geometries are built once per box shape
+geometries = {}
+
+def getGeometry(boxHeight=3, boxWidth=3):
+    if (boxHeight, boxWidth) not in geometries:
+        geometries[(boxHeight, boxWidth)] = SudokuGeometry(boxHeight, boxWidth)
+    return geometries[(boxHeight, boxWidth)]
+
+
+#Static constraint structure of the standard 9X9 grid
+STANDARD_GEOMETRY = getGeometry(3, 3)
+ROW_UNITS = STANDARD_GEOMETRY.rowUnits
+COLUMN_UNITS = STANDARD_GEOMETRY.columnUnits
+BOX_UNITS = STANDARD_GEOMETRY.boxUnits
+UNITS = STANDARD_GEOMETRY.units
+CELL_ROW = STANDARD_GEOMETRY.cellRow
+CELL_COLUMN = STANDARD_GEOMETRY.cellColumn
+CELL_BOX = STANDARD_GEOMETRY.cellBox
+CELL_UNITS = STANDARD_GEOMETRY.cellUnits
+ROW_PEERS = STANDARD_GEOMETRY.rowPeers
+COLUMN_PEERS = STANDARD_GEOMETRY.columnPeers
+BOX_PEERS = STANDARD_GEOMETRY.boxPeers
+PEERS = STANDARD_GEOMETRY.peers
+CELL_COUNTERS = STANDARD_GEOMETRY.cellCounters
+DIGITS = STANDARD_GEOMETRY.digits
+
+class SudokuCSP(CSP):
+    """Class representing Sudoku as a Constraint Satisfaction Problem: an AllDifferent constraint per unit on top of
+       the general CSP, with faster Sudoku specific versions of the search operations. Contains:
+       1. variables - a list of the 81 (or cellCount of geometry) variables (type Variable) of the Sudoku CSP
        2. currentAssignment - comma-seperated current values of all the variable
        3. assignmentCounter - keeps track of the number of assigments to each variable(or a sudoku cell)
+       4. trail - undo log of the (kind, variable position, value) changes made since the last reset. Backtracking
+          rolls back to a trail mark instead of reloading all the variables
+       5. variableClass - Variable, or BitmaskVariable (WideBitmaskVariable above 9 digits) when created with
+          compactDomains=True. Forward checking and AC-3 then skip the neighbours without the bit of the value
+       6. domainBuckets - positions of the unassigned variables grouped by domain size (index 0 to size)
+       7. unassignedCounters - number of unassigned variables in each unit and box segment (see SudokuGeometry)
+       8. valueCounters - like unassignedCounters, the number of unassigned variables in each unit and box segment
+          with each value in their domain. Gives the LCV support counts; only maintained once the LCV heuristic or
+          getSupportCount has asked for it (None until then)
+       9. geometry - the SudokuGeometry of the grid, boxHeight X boxWidth boxes (3 X 3 by default). Its peers and
+          cellCounters are also kept as attributes for speed
+       The buckets, counters and support counts are kept up to date by assign, pruneValue and undoTo, so variables
+       should only be changed through the CSP once it has been reset
     """
 
-    def __init__(self):
-        self.variables = []
-        self.currentAssignment = None
-        self.assignmentCounter = 0
+    def __init__(self, compactDomains=False, boxHeight=3, boxWidth=3):
+        variableClass = Variable
+        if compactDomains:
+            variableClass = BitmaskVariable if boxHeight * boxWidth <= 9 else WideBitmaskVariable
+        CSP.__init__(self, variableClass)
+        self.compactDomains = compactDomains
+        self.geometry = getGeometry(boxHeight, boxWidth)
+        self.peers = self.geometry.peers
+        self.cellCounters = self.geometry.cellCounters
+
+        #The constraint network is the same for every puzzle of the geometry, only the variables are reloaded
+        self.constraints = [AllDifferent(unit) for unit in self.geometry.units]
+        self.constraintsOf = [[self.constraints[u] for u in self.geometry.cellUnits[i]] for i in range(self.geometry.cellCount)]
+        self.neighbours = self.peers
+        self.indexOf = dict((str(i + 1), i) for i in range(self.geometry.cellCount))
+        self.domainBuckets = [set() for size in range(self.geometry.size + 1)]
+        self.unassignedCounters = [0] * self.geometry.counterCount
+        self.valueCounters = None
 
     def reset(self, assignmentList):
-        """Performs a reloading of the variable values and its domain from an assignment list of 81 values"""
-        if len(assignmentList) != 81:
+        """Performs a reloading of the variable values and its domain from an assignment list of 81 (cellCount) values"""
+        if len(assignmentList) != self.geometry.cellCount:
             print('Not enough values to initialise')
             return
 
         self.variables = []
-        #Initialise all the 81 variables
-        for i in range(81):
+        #Initialise all the variables
+        for i in range(self.geometry.cellCount):
             varName = str(i+1) #variables are named 1 to 81 for convenience
             varDomain = []
-            varValue = assignmentList[i]
+            varValue = str(assignmentList[i])
             if varValue == '0':
-                varDomain = ['1', '2', '3', '4', '5', '6', '7', '8', '9']
-            var = Variable(varName, varDomain, varValue)
+                varDomain = list(self.geometry.digits)
+            var = self.variableClass(varName, varDomain, varValue)
             self.variables.append(var)
 
-        #Current assignment is stored as a string of comma seperated values
-        self.currentAssignment = ','.join(assignmentList)
+        self.trail = []
         self.setDomains()
+        self.buildSelectionIndex()
 
     def setDomains(self):        
-        for i in range(81):
+        for i in range(self.geometry.cellCount):
             if self.variables[i].isAssigned == False:
-                allNeighbours = self.getRowNeighbours(self.variables[i]) + \
-                                self.getColumnNeighbours(self.variables[i]) + \
-                                self.getBoxNeighbours(self.variables[i])
-                for neighbour in allNeighbours:
-                    if neighbour.isAssigned == True:
-                        self.variables[i].removeFromDomain(neighbour.getValue())
-
-    def getCurrentAssignment(self):
-        return self.currentAssignment
-
-    def getAssignmentCount(self):
-       return self.assignmentCounter
-    
-    def getVariable(self, variableName):
-        """return the Variable object given the variable name"""
-        for i in range(len(self.variables)):
-            if self.variables[i].getName() == variableName:
-                return self.variables[i]
-        return None
-
-    def selectUnassignedVariable(self, mrvHeuristic=False, maxDegreeHeuristic=False):
-        """Returns the next variable to be assigned based on the policy"""
-        if mrvHeuristic == False:
-            #'standard-backtrack' returns the variables in order
-            for variable in self.variables:
-                if not variable.isAssigned:
-                    return variable
-            return None
-        elif mrvHeuristic == True:
-            minDomainValues = 10
-            minVariablesList = []
-            for variable in self.variables:
-                if not variable.isAssigned:
-                   if len(variable.getDomain()) < minDomainValues:
-                        minDomainValues = len(variable.getDomain())
-                        minVariablesList.clear()
-                        minVariablesList.append(variable)
-                   elif len(variable.getDomain()) == minDomainValues:
-                        minVariablesList.append(variable)
-            if len(minVariablesList) > 1 and maxDegreeHeuristic == True:
-                maxDegree = -1
-                maxDegreeVariablesList = []
-                for v in minVariablesList:
-                    if self.getUnassignedNeighboursCount(v) > maxDegree:
-                        maxDegree = self.getUnassignedNeighboursCount(v)
-                        maxDegreeVariablesList.clear()
-                        maxDegreeVariablesList.append(v)
-                    elif self.getUnassignedNeighboursCount(v) == maxDegree:
-                        maxDegreeVariablesList.append(v)
-                return maxDegreeVariablesList[0]
-            else:     
-                if minVariablesList: return minVariablesList[0]
-            return None
+                for j in self.peers[i]:
+                    if self.variables[j].isAssigned == True:
+                        self.variables[i].removeFromDomain(self.variables[j].getValue())
+
+    def buildSelectionIndex(self):
+        """Computes the domain size buckets and unassigned counters from scratch"""
+        self.domainBuckets = [set() for size in range(self.geometry.size + 1)]
+        self.unassignedCounters = [0] * self.geometry.counterCount
+        for i in range(self.geometry.cellCount):
+            variable = self.variables[i]
+            if not variable.isAssigned:
+                self.domainBuckets[variable.getDomainSize()].add(i)
+                for k in self.cellCounters[i]:
+                    self.unassignedCounters[k] += 1
+        if self.valueCounters != None:
+            self.buildValueCounters()
+
+    def buildValueCounters(self):
+        """Counts for every unit and box segment how many unassigned variables have each value in their domain.
+           From then on the counts are updated along with the domains"""
+        self.valueCounters = [dict.fromkeys(self.geometry.digits, 0) for k in range(self.geometry.counterCount)]
+        for i in range(self.geometry.cellCount):
+            if not self.variables[i].isAssigned:
+                for value in self.variables[i].getDomain():
+                    for k in self.cellCounters[i]:
+                        self.valueCounters[k][value] += 1
+
+    def getSupportCount(self, index, value):
+        """Number of unassigned neighbours of the variable at position index with value in their domain"""
+        if self.valueCounters == None:
+            self.buildValueCounters()
+        row, column, box, rowSegment, columnSegment = self.cellCounters[index]
+        counters = self.valueCounters
+        count = counters[row][value] + counters[column][value] + counters[box][value] - \
+                counters[rowSegment][value] - counters[columnSegment][value]
+        variable = self.variables[index]
+        if not variable.isAssigned and variable.isInDomain(value):
+            count -= 1
+        return count
 
     def orderDomainValues(self, variable, lcvHeuristic=False):
         """Returns the domain values of the variable. Order of the variables depends on the policy"""
         domainValues = []
-        if lcvHeuristic == True and len(variable.getDomain()) > 1:
-            #Get All unassigned neighbors of the current variable
-            allNeighbours = self.getRowNeighbours(variable) + \
-                            self.getColumnNeighbours(variable) + \
-                            self.getBoxNeighbours(variable)
-            allNeighbours = [v for v in allNeighbours if v.isAssigned == False]
-
-            #For each value, get the number of times it occurs (which is the same as number of times it rules out
-            #that value of the neighbour) in the neighbours.
-            #And Order them in ascending order
-            valueWithReductionsCount = []
-            for value in variable.getDomain():
-                reductions = 0
-                for neighbour in allNeighbours:
-                    if value in neighbour.getDomain():
-                        reductions += 1
-                valueWithReductionsCount.append((value, reductions))
-                
-                #The value 'value' can be ruled out 'reductions' times from its neighbors 
-                valueWithReductionsCount = sorted(valueWithReductionsCount, key=lambda tup: tup[1])
-                domainValues = [value for (value,reductions) in valueWithReductionsCount]
+        if lcvHeuristic == True and variable.getDomainSize() > 1:
+            if self.valueCounters == None:
+                self.buildValueCounters()
+
+            #The number of unassigned neighbours with a value in their domain is the number of times the value
+            #rules out a value of a neighbour. Order the values by it in ascending order. The variable itself is
+            #counted for every value of its domain, which does not change the order
+            row, column, box, rowSegment, columnSegment = [self.valueCounters[k] for k in self.cellCounters[self.getVariableIndex(variable)]]
+            domainValues = sorted(self.breakTies(variable.getDomain()), key=lambda value: row[value] + column[value] + box[value] - rowSegment[value] - columnSegment[value])
+        elif self.random != None:
+            domainValues = self.breakTies(variable.getDomain())
         else: 
             #'standard-backtrack' returns the values in sorted order
             domainValues = sorted(variable.getDomain())
         return domainValues
 
-    def applyInferences(self, variable, value, forwardCheck=False):
-        if forwardCheck == True:
-            #Get the names of all unassigned neighbours
-            allNeighbours = self.getRowNeighbours(variable) + \
-                            self.getColumnNeighbours(variable) + \
-                            self.getBoxNeighbours(variable)
-            neighbourNames = []
-            for neighbour in allNeighbours:
-                if not neighbour.isAssigned:
-                    neighbourNames.append(neighbour.getName())
-
-            #Remove the value from the domains of the neighbours
-            for i in range(81):
-                if self.variables[i].getName() in neighbourNames:
-                    self.variables[i].removeFromDomain(value)
-                    if len(self.variables[i].getDomain()) == 0:
+    def applyInferences(self, variable, value, forwardCheck=False, inference=INFERENCE_NONE, rules=()):
+        """Prunes the domains after the assignment of value to variable. Returns false if a domain was wiped out.
+           inference is INFERENCE_FORWARD_CHECK (same as forwardCheck=True) or INFERENCE_AC3. rules names the
+           propagationRules to apply afterwards"""
+        if inference == INFERENCE_AC3:
+            if self.propagateArcConsistency([self.getVariableIndex(variable)]) == False:
+                return False
+        elif forwardCheck == True or inference == INFERENCE_FORWARD_CHECK:
+            #Remove the value from the domains of all unassigned neighbours
+            if self.compactDomains:
+                #Only the neighbours with the bit of the value in their mask are pruned
+                bit = BIT_OF[value]
+                for j in self.peers[self.getVariableIndex(variable)]:
+                    neighbour = self.variables[j]
+                    if neighbour.mask & bit and not neighbour.isAssigned:
+                        self.pruneValue(j, value)
+                        if neighbour.mask == 0:
+                            return False
+            else:
+                for j in self.peers[self.getVariableIndex(variable)]:
+                    neighbour = self.variables[j]
+                    if not neighbour.isAssigned and self.pruneValue(j, value) and neighbour.getDomainSize() == 0:
                         return False
+        if rules:
+            return self.applyPropagationRules(rules, self.getAssignmentMark(variable, value))
         return True
 
-    def reverseInferences(self, variable, value, forwardCheck=False):
-        if forwardCheck == True:
-            #Get the names of all unassigned neighbours
-            allNeighbours = self.getRowNeighbours(variable) + \
-                            self.getColumnNeighbours(variable) + \
-                            self.getBoxNeighbours(variable)
-            neighbourNames = []
-            for neighbour in allNeighbours:
-                if not neighbour.isAssigned:
-                    neighbourNames.append(neighbour.getName)
-
-            #Add the value back to the domains of unassigned neighbours
-            for i in range(81):
-                if self.variables[i].getName() in neighbourNames:
-                    self.variables[i].addToDomain(value)
-    
-    def getUnassignedCount(self):
-        """Returns the count of remaining unassigned variables"""
-        count = 0
-        for variable in self.variables:
-            if not variable.isAssigned: count += 1
-        return count
-            
-    def isAssignmentComplete(self):
-        #Assignment is complete when there are no more variables to assign
-        return self.selectUnassignedVariable() == None
-    
-    def isAllDiff(self, valuesList):
-        """Utility function for evaluating the AllDiff constraint. Returns true if all the values in valuesList are different"""
-        valuesList = list(filter(lambda value: value != '0', valuesList))
-        return len(valuesList) == len(set(valuesList))
+    def propagateArcConsistency(self, queue=None):
+        """AC-3 for the not-equal constraints between neighbours. An arc (x, y) can only lose values when y is
+           decided (assigned or down to a single value), so the worklist holds the decided variables whose value
+           still has to be removed from their neighbours. Starts from all the decided variables when queue is None.
+           Prunings are recorded on the trail. Returns false if a domain was wiped out"""
+        if queue == None:
+            queue = [i for i in range(self.geometry.cellCount) if self.variables[i].isAssigned or self.variables[i].getDomainSize() == 1]
+        queue = deque(queue)
+        compactDomains = self.compactDomains
+        while queue:
+            index = queue.popleft()
+            value = self.getDecidedValue(index)
+            bit = BIT_OF[value] if compactDomains else 0
+            for j in self.peers[index]:
+                neighbour = self.variables[j]
+                if compactDomains and not neighbour.mask & bit:
+                    continue
+                if not neighbour.isAssigned and self.pruneValue(j, value):
+                    domainSize = neighbour.getDomainSize()
+                    if domainSize == 0:
+                        return False
+                    if domainSize == 1:
+                        queue.append(j)
+        return True
+
+    def applyPropagationRules(self, rules, mark=None):
+        """Applies the named propagation rules until none of them prunes a domain. Rules only look at the units
+           with a cell changed on the trail after mark (all units when mark is None) or during the previous pass.
+           Cells left with a single value by a rule have that value removed from their neighbours (naked singles)
+           before the next rule runs. Returns false if a rule finds a contradiction"""
+        changedUnits = None
+        if mark != None:
+            changedUnits = self.getChangedUnits(mark)
+        while changedUnits == None or changedUnits:
+            units = self.geometry.units if changedUnits == None else [self.geometry.units[u] for u in sorted(changedUnits)]
+            passMark = self.getTrailMark()
+            for rule in rules:
+                ruleMark = self.getTrailMark()
+                if self.propagationRules[rule](self, units) == False:
+                    return False
+                singles = [index for (kind, index, value) in self.trail[ruleMark:]
+                           if not self.variables[index].isAssigned and self.variables[index].getDomainSize() == 1]
+                if singles and self.propagateArcConsistency(singles) == False:
+                    return False
+            changedUnits = self.getChangedUnits(passMark)
+        return True
+
+    def getChangedUnits(self, mark):
+        """Returns the positions in geometry.units of the units with a cell changed on the trail after mark"""
+        changedUnits = set()
+        cellUnits = self.geometry.cellUnits
+        for position in range(mark, len(self.trail)):
+            changedUnits.update(cellUnits[self.trail[position][1]])
+        return changedUnits
+
+    def getUnitCandidates(self, unit):
+        """Returns the values assigned in a unit and, for every other value, the unassigned cells that can take it.
+           Without forward checking the assigned values can still be in the domains of the other cells of the unit,
+           so they are left out of the places"""
+        assignedValues = set(self.variables[index].getValue() for index in unit if self.variables[index].isAssigned)
+        places = {}
+        for index in unit:
+            variable = self.variables[index]
+            if not variable.isAssigned:
+                for value in variable.getDomain():
+                    if value not in assignedValues:
+                        places.setdefault(value, []).append(index)
+        return assignedValues, places
+
+    def applyHiddenSingles(self, units):
+        """A value that fits in only one cell of a unit has to go in that cell"""
+        for unit in units:
+            assignedValues, places = self.getUnitCandidates(unit)
+            if len(assignedValues) + len(places) < len(unit):
+                return False #some value has no place left in the unit
+            for value, cells in places.items():
+                if len(cells) == 1 and self.variables[cells[0]].getDomainSize() > 1:
+                    otherValues = [v for v in self.variables[cells[0]].getDomain() if v != value]
+                    self.pruneValues(cells[0], otherValues)
+        return True
+
+    def applyNakedSubsets(self, units):
+        """When 2 (or 3) cells of a unit can only take the same 2 (or 3) values, no other cell of the unit can"""
+        for unit in units:
+            unassigned = [i for i in unit if not self.variables[i].isAssigned]
+            for size in (2, 3):
+                candidates = [i for i in unassigned if 1 < self.variables[i].getDomainSize() <= size]
+                for subset in combinations(candidates, size):
+                    values = set()
+                    for i in subset:
+                        values.update(self.variables[i].getDomain())
+                    if len(values) < size:
+                        return False #more cells than values
+                    if len(values) == size:
+                        for i in unassigned:
+                            if i not in subset and not self.pruneValues(i, values):
+                                return False
+        return True
+
+    def applyLockedCandidates(self, units):
+        """Pointing: when the cells of a box that can take a value are all in one row (or column), no other cell of
+           that row (or column) can take it. Box-line reduction: when the cells of a row (or column) that can take a
+           value are all in one box, no other cell of that box can take it"""
+        geometry = self.geometry
+        lineLength = max(geometry.boxHeight, geometry.boxWidth) #most cells a box shares with a row or column
+        for unit in units:
+            unitCells = set(unit)
+            assignedValues, places = self.getUnitCandidates(unit)
+            for value, cells in places.items():
+                if len(cells) > lineLength:
+                    continue
+                #Any other unit holding all the cells shares them with this one (a box with a row or column)
+                for otherUnit in (geometry.rowUnits[geometry.cellRow[cells[0]]], geometry.columnUnits[geometry.cellColumn[cells[0]]],
+                                  geometry.boxUnits[geometry.cellBox[cells[0]]]):
+                    if otherUnit == unit or not all(i in otherUnit for i in cells):
+                        continue
+                    for i in otherUnit:
+                        if i not in unitCells and not self.variables[i].isAssigned and not self.pruneValues(i, [value]):
+                            return False
+        return True
 
+    #Rules available to applyInferences by name. A rule takes the CSP and the list of units to examine, prunes
+    #domains through pruneValue and returns false on a contradiction. More rules can be registered here
+    propagationRules = {'hiddenSingles': applyHiddenSingles,
+                        'nakedSubsets': applyNakedSubsets,
+                        'lockedCandidates': applyLockedCandidates}
+
+    def undoTo(self, mark):
+        """Rolls back the assignments and domain prunings recorded on the trail after mark"""
+        trail = self.trail
+        buckets = self.domainBuckets
+        while len(trail) > mark:
+            kind, index, value = trail.pop()
+            variable = self.variables[index]
+            if kind == TRAIL_ASSIGN:
+                variable.unAssign(value)
+                buckets[variable.getDomainSize()].add(index)
+                counters = self.unassignedCounters
+                for k in self.cellCounters[index]:
+                    counters[k] += 1
+                if self.valueCounters != None:
+                    for domainValue in variable.getDomain():
+                        for k in self.cellCounters[index]:
+                            self.valueCounters[k][domainValue] += 1
+            else:
+                variable.addToDomain(value)
+                if not variable.isAssigned:
+                    size = variable.getDomainSize()
+                    buckets[size - 1].discard(index)
+                    buckets[size].add(index)
+                    if self.valueCounters != None:
+                        for k in self.cellCounters[index]:
+                            self.valueCounters[k][value] += 1
+
+    def pruneValue(self, index, value):
+        """Removes value from the domain of the variable at position index and records it on the trail"""
+        variable = self.variables[index]
+        if variable.removeFromDomain(value):
+            self.trail.append((TRAIL_PRUNE, index, value))
+            if not variable.isAssigned:
+                size = variable.getDomainSize()
+                self.domainBuckets[size + 1].discard(index)
+                self.domainBuckets[size].add(index)
+                if self.valueCounters != None:
+                    for k in self.cellCounters[index]:
+                        self.valueCounters[k][value] -= 1
+            return True
+        return False
+    
     def assign(self, variable, value):
         """Assign value to the variable """
+        index = self.getVariableIndex(variable)
+        domainSize = variable.getDomainSize()
+        if self.valueCounters != None and not variable.isAssigned and variable.isInDomain(value):
+            #The variable no longer counts as unassigned with these values
+            for domainValue in variable.getDomain():
+                for k in self.cellCounters[index]:
+                    self.valueCounters[k][domainValue] -= 1
         success = variable.assign(value)
-        for i in range(81):
-            if self.variables[i].getName() == variable.getName():
-                self.variables[i] = variable
+        self.variables[index] = variable
         if success:
             self.assignmentCounter += 1
+            self.trail.append((TRAIL_ASSIGN, index, value))
+            self.domainBuckets[domainSize].discard(index)
+            counters = self.unassignedCounters
+            for k in self.cellCounters[index]:
+                counters[k] -= 1
+        return success
 
-        #update the current assignment
-        self.currentAssignment = ','.join([v.getValue() for v in self.variables])
-
-    def unAssign(self, variable, value):
-        """For undoing the assignment of value to variable"""
-        for i in range(81):
-            if self.variables[i].getName() == variable.getName():
-                self.variables[i].unAssign(value)
-        
     def getColumnNeighbours(self, variable):
-        varNumber = int(variable.getName())
-        colNeighbours = []
-       
-        for v in self.variables:
-            if (abs(varNumber - int(v.getName())) % 9 == 0) and v.getName() != variable.getName():
-                colNeighbours.append(v)
-
-        return colNeighbours
+        return [self.variables[j] for j in self.geometry.columnPeers[self.getVariableIndex(variable)]]
 
     def getRowNeighbours(self, variable):
-        varNumber = int(variable.getName())
-        rowNeighbors = []
-
-        #Calculate the starting and ending positions of that row
-        rowStart = rowEnd = varNumber
-        if varNumber % 9 == 0:
-            rowStart = ((int(varNumber/9)) - 1) * 9 + 1
-        else:
-            rowStart = math.floor(varNumber/9) * 9 + 1
-            rowEnd = math.ceil(varNumber/9) * 9
-            
-        for v in self.variables:
-            if int(v.getName()) in range(rowStart, rowEnd + 1) and v.getName() != variable.getName():
-                rowNeighbors.append(v)
-
-        return rowNeighbors
+        return [self.variables[j] for j in self.geometry.rowPeers[self.getVariableIndex(variable)]]
 
     def isInSameBox(self, position1, position2):
         """Returns true if 2 variables given their position (from 1 to 81) belongs to same 3X3 box"""
-        return math.ceil(position1 / 27) == math.ceil(position2 / 27) and \
-           math.ceil((position1 % 9) / 3) == math.ceil((position2 % 9) / 3)
+        return self.geometry.cellBox[position1 - 1] == self.geometry.cellBox[position2 - 1]
     
     def getBoxNeighbours(self, variable):
-        varNumber = int(variable.getName())
-        boxNeighbours = []
-
-        for v in self.variables:
-            if self.isInSameBox(varNumber, int(v.getName())) and v.getName() != variable.getName():
-                boxNeighbours.append(v)
-
-        return boxNeighbours
+        return [self.variables[j] for j in self.geometry.boxPeers[self.getVariableIndex(variable)]]
 
-    def getUnassignedNeighboursCount(self, variable):
-        count = 0
-        allNeighbours = self.getRowNeighbours(variable) + \
-                        self.getColumnNeighbours(variable) + \
-                        self.getBoxNeighbours(variable)
-
-        for neighbour in allNeighbours:
-            if neighbour.isAssigned == False:
-                count += 1
-        return count
+    def getUnassignedDegree(self, index):
+        """Number of unassigned neighbours of the variable at position index, from the unassigned counters"""
+        row, column, box, rowSegment, columnSegment = self.cellCounters[index]
+        counters = self.unassignedCounters
+        degree = counters[row] + counters[column] + counters[box] - counters[rowSegment] - counters[columnSegment]
+        if not self.variables[index].isAssigned:
+            degree -= 1
+        return degree
         
     def isConstraintsSatisfied(self, variable, value):
         """Evaluates the 3 AllDiff constraints after the assignment of value to variable"""
+        if self.compactDomains:
+            #The same check on the bits of the assigned values of each unit
+            index = self.getVariableIndex(variable)
+            units = self.geometry.units
+            for u in self.geometry.cellUnits[index]:
+                seen = BIT_OF[value]
+                for j in units[u]:
+                    neighbour = self.variables[j]
+                    if j != index and neighbour.isAssigned:
+                        bit = BIT_OF[neighbour.digit]
+                        if seen & bit:
+                            return False
+                        seen |= bit
+            return True
+
         rowNeighbours = self.getRowNeighbours(variable)
         rowValues = [neighbour.getValue() for neighbour in rowNeighbours]
         rowValues.append(value)
@@ -266,9 +478,11 @@ class SudokuCSP():
     def print(self, file=None):
         """Print the assignment list as a sudoku grid"""
         listOfValues = self.currentAssignment.split(',')
-        for i in range(81):
-            print(listOfValues[i], end='  ', file=file)
-            if(i % 9 == 8):print(file=file)
+        size = self.geometry.size
+        width = len(str(size))
+        for i in range(size * size):
+            print(listOfValues[i].ljust(width), end='  ', file=file)
+            if(i % size == size - 1):print(file=file)
 
 if __name__ == '__main__':
     sudokuGrid = SudokuGrid('/Users/apple/Documents/git-repos/sudoku/sudoku-as-csp/input-data/18/4.sd')
@@ -1,19 +1,45 @@
 import numpy as np
 
+def parseValue(value):
+    """Converts a cell value of an input file to the value used by the CSP"""
+    if value == '.':
+        return '0'
+    if value.isalpha() and len(value) == 1:
+        return str(ord(value.upper()) - ord('A') + 10)
+    if not value.isdigit():
+        raise ValueError("The format of input data is not correct")
+    return str(int(value))
+
 class SudokuGrid:
+    """A sudoku read from a file of size lines of size values separated by spaces, where size is the number of
+       values on the first line (9 for the standard grid, 16, 25, ...). Empty cells are 0 or '.', values above 9
+       can also be written as letters (A = 10, B = 11, ...). Contains:
+       1. grid - size X size array of the values as strings, '0' for an empty cell
+       2. boxHeight, boxWidth - the shape of the boxes. When not given the boxes are as square as possible with
+          boxHeight <= boxWidth (3 X 3 for 9, 4 X 4 for 16, 2 X 3 for 6)
+    """
 
-    def __init__(self, inputFile):
-        self.grid = np.zeros([9, 9], dtype=str)
+    def __init__(self, inputFile, boxHeight=None, boxWidth=None):
         f = open(inputFile, 'r') 
         lines = f.readlines()
         f.close()
         
-        if len(lines) < 9:
+        size = len(lines[0].split()) if lines else 0
+        if size == 0 or len(lines) < size:
+            raise ValueError("The format of input data is not correct")
+        if boxHeight == None or boxWidth == None:
+            boxHeight = max(h for h in range(1, int(size ** 0.5) + 1) if size % h == 0)
+            boxWidth = size // boxHeight
+        if boxHeight * boxWidth != size:
             raise ValueError("The format of input data is not correct")
+        self.size = size
+        self.boxHeight = boxHeight
+        self.boxWidth = boxWidth
 
-        for i in range(9):
-            columnValues = lines[i].rstrip().split(' ')
-            if len(columnValues) != 9:
+        self.grid = np.zeros([size, size], dtype='<U%d' % len(str(size)))
+        for i in range(size):
+            columnValues = [parseValue(value) for value in lines[i].split()]
+            if len(columnValues) != size or any(int(value) > size for value in columnValues):
                 raise ValueError("The format of input data is not correct")
             self.grid[i] = columnValues
             
@@ -1,12 +1,50 @@
 from sudoku_csp import SudokuCSP
 from variable import Variable
 from sudoku_grid import SudokuGrid
+from solution_cache import SolutionCache
+from results_index import ResultsIndex
 import backtrack
+import dlx
+import argparse
+import concurrent.futures
 import os
-import shutil
+import time
 
+#Search options of the backtracking versions, v4 is solved with dancing links instead
+VERSION_OPTIONS = {
+    'v1': {},
+    'v2': {'forwardCheck': True},
+    'v3': {'forwardCheck': True, 'mrvHeuristic': True, 'maxDegreeHeuristic': True, 'lcvHeuristic': True},
+}
 
-def runOnFile(inputFile, version, outputDirectory):
+#Optional SolutionCache of the process. Puzzles found in it are written with status STATUS_CACHED and no assignments.
+#Its entries are scoped by version, so a version is only answered with solutions it found itself
+solutionCache = None
+STATUS_CACHED = 'cached'
+
+#Optional ResultsIndex of the process, every result written to a count file is added to it too
+resultsIndex = None
+#Name of the results index in the output directory of a dataset
+RESULTS_INDEX_FILE = 'results.sqlite'
+
+
+def initSolutionCache(storePath=None):
+    global solutionCache
+    solutionCache = SolutionCache(storePath=storePath)
+
+
+def initWorker(useCache=False, indexPath=None):
+    """Initializer of the worker processes: opens their solution cache and results index"""
+    global resultsIndex
+    if useCache:
+        initSolutionCache()
+    if indexPath != None:
+        resultsIndex = ResultsIndex(indexPath)
+
+
+def runOnFile(inputFile, version, outputDirectory, budget=None):
+    """Solves one sudoku and writes its solution and the assignment count and status of the search. The
+       backtracking versions stop when budget (default: DEFAULT_MAX_ASSIGNMENTS assignments) runs out"""
     #If the sudoku was already solved quit
     filePath = os.path.join(outputDirectory, os.path.splitext(os.path.basename(os.path.normpath(inputFile)))[0])
     solutionFilePath = filePath + '_solution_' + version + '.txt'
@@ -15,39 +53,147 @@ def runOnFile(inputFile, version, outputDirectory):
 
     ##Solve the sudoku and store the solution and assignment count in file
     sudokuGrid = SudokuGrid(inputFile)
-    csp = SudokuCSP()
+    csp = SudokuCSP(compactDomains=True, boxHeight=sudokuGrid.boxHeight, boxWidth=sudokuGrid.boxWidth)
     csp.reset(sudokuGrid.convert())                   
-    if version == 'v1':
-        backtrack.backtrackSearch(csp)
-    elif version == 'v2':
-        backtrack.backtrackSearch(csp, forwardCheck=True)
-    elif version == 'v3':
-        backtrack.backtrackSearch(csp, forwardCheck=True, mrvHeuristic=True, maxDegreeHeuristic=True, lcvHeuristic=True)
+    #The solution cache only handles 9X9 grids
+    useCache = solutionCache != None and sudokuGrid.size == 9
+    cachedSolution = solutionCache.get(sudokuGrid.convert(), version) if useCache else None
+    startTime = time.perf_counter()
+    if cachedSolution != None:
+        csp.reset(cachedSolution)
+        status = STATUS_CACHED
+    elif version in VERSION_OPTIONS:
+        if budget == None:
+            budget = backtrack.SearchBudget(maxAssignments=backtrack.DEFAULT_MAX_ASSIGNMENTS)
+        status = backtrack.solve(csp, budget=budget, **VERSION_OPTIONS[version]).status
+    elif version == 'v4':
+        status = dlx.dlxSolve(csp)[1]
     else: return
-    
+    seconds = time.perf_counter() - startTime
+    if useCache and status == backtrack.STATUS_SOLVED:
+        solutionCache.put(sudokuGrid.convert(), csp.getCurrentAssignment().split(','), version)
+
     with open(solutionFilePath, 'w') as f:
         csp.print(file=f)
     with open(countFilePath, 'w') as f:
         print(csp.getAssignmentCount(), file=f)
+        print(status, file=f)
+    if resultsIndex != None:
+        puzzle = os.path.basename(os.path.dirname(inputFile)) + '/' + os.path.basename(inputFile)
+        clues = sum(1 for value in sudokuGrid.convert() if value != '0')
+        resultsIndex.add(puzzle, version, clues, status, csp.getAssignmentCount(), seconds if status != STATUS_CACHED else None)
 
-def runOnDataSet(inputRootDirectory):
+def getTasks(inputRootDirectory, outputRootDirectory, versions=('v1', 'v2', 'v3')):
+    """Returns the (input file, version, output directory) tasks for a dataset, creating the output directories.
+       Directories are named by their number of initial values and the ones with fewer values (the slowest
+       sudokus) come first"""
+    directories = [d for d in os.listdir(inputRootDirectory) if os.path.isdir(os.path.join(inputRootDirectory, d))]
+    directories.sort(key=lambda d: (0, int(d)) if d.isdigit() else (1, d))
+    tasks = []
+    for directory in directories:
+        outputDirectory = os.path.join(outputRootDirectory, directory)
+        if not os.path.exists(outputDirectory): os.makedirs(outputDirectory)
+        for file in sorted(os.listdir(os.path.join(inputRootDirectory, directory))):
+            if file.endswith(".sd"):
+                fullFilePath = os.path.join(os.path.join(inputRootDirectory, directory), file)
+                for version in versions:
+                    tasks.append((fullFilePath, version, outputDirectory))
+    return tasks
+
+def taskName(task):
+    inputFile, version, outputDirectory = task
+    return '%s on %s' % (version, os.path.basename(os.path.dirname(inputFile)) + '/' + os.path.basename(inputFile))
+
+def runOnPool(tasks, workers, tasksPerWorker=2, useCache=False, indexPath=None):
+    """Runs the tasks on a pool of worker processes. Tasks are submitted in order, keeping at most
+       tasksPerWorker tasks per worker queued, so the slow tasks at the front of the list start first.
+       If a worker process dies the pool is replaced and the tasks that were running are returned. With useCache
+       every worker keeps its own in-memory solution cache. The workers add their results to the results index
+       at indexPath when given"""
+    pending = list(reversed(tasks))
+    interrupted = []
+    while pending:
+        running = {}
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(useCache, indexPath))
+        try:
+            while pending or running:
+                while pending and len(running) < workers * tasksPerWorker:
+                    task = pending.pop()
+                    running[executor.submit(runOnFile, *task)] = task
+                    print('%s started' % taskName(task))
+                done, notDone = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        future.result()
+                        print('%s complete' % taskName(task))
+                    except concurrent.futures.process.BrokenProcessPool:
+                        running[future] = task
+                        raise
+                    except Exception as e:
+                        print('%s failed: %s' % (taskName(task), e))
+        except concurrent.futures.process.BrokenProcessPool:
+            #The whole pool is unusable once a worker dies, so every unfinished task is interrupted
+            interrupted.extend(running.values())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    return interrupted
+
+def runInParallel(tasks, workers, useCache=False, indexPath=None):
+    interrupted = runOnPool(tasks, workers, useCache=useCache, indexPath=indexPath)
+    #Tasks interrupted by a worker crash are rerun one at a time so that only the task that crashes fails
+    for task in interrupted:
+        print('%s interrupted by a worker crash, retrying' % taskName(task))
+        if runOnPool([task], 1, useCache=useCache, indexPath=indexPath):
+            print('%s failed: worker process died' % taskName(task))
+
+def runOnDataSet(inputRootDirectory, workers=1, versions=('v1', 'v2', 'v3'), useCache=False, cacheFile=None, useIndex=True):
+    """Solves every sudoku of a dataset with each version. With useCache puzzles equivalent to one solved before
+       (by the same version) are answered from a solution cache, which is kept on disk in cacheFile for serial runs.
+       With useIndex the results are also added to the RESULTS_INDEX_FILE results index of the output directory"""
+    global solutionCache, resultsIndex
     outputRootDirectory = os.path.join(os.path.abspath(os.path.join(inputRootDirectory, os.pardir)), 'output-data')
     if not os.path.exists(outputRootDirectory):
         os.makedirs(outputRootDirectory)
 
-    for root, dirs, files in os.walk(inputRootDirectory):
-        for directory in dirs:
-            outputDirectory = os.path.join(outputRootDirectory, directory)
-            if not os.path.exists(outputDirectory): os.makedirs(outputDirectory)
-            for file in os.listdir(os.path.join(inputRootDirectory, directory)):
-                if file.endswith(".sd"):
-                    fullFilePath = os.path.join(os.path.join(inputRootDirectory, directory), file)
-                    csp_versions = ['v1', 'v2', 'v3']
-                    for version in csp_versions:
-                        print('%s on %s started' % (version, directory+'/'+file))
-                        runOnFile(fullFilePath, version, outputDirectory)
-                        print('%s on %s complete' % (version, directory+'/'+file))
-    
-        
-inputRootDirectory = '/Users/apple/Documents/git-repos/sudoku/version3/constraint-satisfaction-problem-solver/input-data'
-runOnDataSet(inputRootDirectory)
+    indexPath = os.path.join(outputRootDirectory, RESULTS_INDEX_FILE) if useIndex else None
+    tasks = getTasks(inputRootDirectory, outputRootDirectory, versions)
+    if workers > 1:
+        runInParallel(tasks, workers, useCache=useCache, indexPath=indexPath)
+        return
+
+    if useCache:
+        initSolutionCache(cacheFile)
+    if useIndex:
+        resultsIndex = ResultsIndex(indexPath)
+    try:
+        for task in tasks:
+            print('%s started' % taskName(task))
+            runOnFile(*task)
+            print('%s complete' % taskName(task))
+    finally:
+        if solutionCache != None:
+            print('Solution cache: %d hits, %d misses' % (solutionCache.hits, solutionCache.misses))
+            solutionCache.close()
+            solutionCache = None
+        if resultsIndex != None:
+            resultsIndex.close()
+            resultsIndex = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve every sudoku in a dataset with each CSP version')
+    parser.add_argument('inputRootDirectory', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input-data'))
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (default: 1, serial)')
+    parser.add_argument('--versions', nargs='+', default=['v1', 'v2', 'v3'],
+                        help='v1 backtracking, v2 with forward checking, v3 with heuristics, v4 dancing links')
+    parser.add_argument('--cache', action='store_true',
+                        help='answer puzzles equivalent to an already solved one (up to symmetry) from a solution cache')
+    parser.add_argument('--cache-file', help='keep the solution cache in this file (serial runs only)')
+    parser.add_argument('--no-index', action='store_true', help='do not add the results to the results index of the output directory')
+    args = parser.parse_args()
+    if args.cache_file and args.workers > 1:
+        parser.error('--cache-file can only be used with a single worker')
+    runOnDataSet(args.inputRootDirectory, workers=args.workers, versions=args.versions,
+                 useCache=args.cache or args.cache_file != None, cacheFile=args.cache_file, useIndex=not args.no_index)
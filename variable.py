@@ -6,6 +6,7 @@ class Variable:
        3. value - the current value of the variable. Value '0' means unassigned variable 
        4. isAssigned - true if the variable is currently assigned. False otherwises
     """
+    __slots__ = ('name', 'value', 'domain', 'isAssigned')
 
     def __init__(self, name, domain, value='0'):
         self.name = name
@@ -26,6 +27,12 @@ class Variable:
 
     def getDomain(self):
         return list(self.domain)
+
+    def getDomainSize(self):
+        return len(self.domain)
+
+    def isInDomain(self, value):
+        return value in self.domain
        
     def assign(self, value):
         """Assigns value to the variable and returns success/failure"""
@@ -44,7 +51,11 @@ class Variable:
         self.domain.add(value)
         
     def removeFromDomain(self, value):
-        self.domain.discard(value)
+        """Remove a value from the domain. Returns true if the value was in the domain"""
+        if value in self.domain:
+            self.domain.discard(value)
+            return True
+        return False
 
     def removeValuesFromDomain(self, valuesList):
         """Remove a set of values from the domain"""
@@ -69,10 +80,157 @@ class Variable:
         else:
             print("unassigned")
 
+
+#Lookup tables for 9-bit domain masks. Bit d-1 of a mask is set when digit d is in the domain
+DOMAIN_SIZE = [bin(mask).count('1') for mask in range(512)]
+LOWEST_DIGIT = [(mask & -mask).bit_length() for mask in range(512)] #0 for an empty domain
+DOMAIN_VALUES = [tuple(str(d) for d in range(1, 10) if mask & (1 << (d - 1))) for mask in range(512)]
+
+#Cell values as strings ('0' to '64') or integers (0 to 64) mapped to the integer digit. Grids larger than 9X9
+#use the values above '9'
+MAX_DIGIT = 64
+DIGIT_OF = dict([(str(d), d) for d in range(MAX_DIGIT + 1)] + [(d, d) for d in range(MAX_DIGIT + 1)])
+VALUE_OF = [str(d) for d in range(MAX_DIGIT + 1)]
+#Cell values as in DIGIT_OF mapped to their bit in a domain mask, so the domain operations need a single lookup
+BIT_OF = dict((value, 1 << (digit - 1)) for (value, digit) in DIGIT_OF.items() if digit != 0)
+
+class BitmaskVariable:
+    """Compact alternative to Variable for digit domains 1 to 9 with the same API. Contains:
+       1. name - an identifier for the variable (represented as a string)
+       2. mask - the domain of the variable as a 9-bit integer
+       3. digit - the current value of the variable as an integer. 0 means unassigned variable
+       4. isAssigned - true if the variable is currently assigned. False otherwise
+       Values can be passed as strings ('1' to '9') or integers, getValue() returns a string like Variable.
+    """
+    __slots__ = ('name', 'mask', 'digit', 'isAssigned')
+
+    def __init__(self, name, domain, value='0'):
+        self.name = name
+        self.digit = DIGIT_OF[value]
+        self.mask = 0
+        for domainValue in domain:
+            self.mask |= 1 << (DIGIT_OF[domainValue] - 1)
+        if self.digit != 0:
+            self.mask &= ~(1 << (self.digit - 1))
+        self.isAssigned = self.digit != 0
+
+    @property
+    def value(self):
+        return VALUE_OF[self.digit]
+
+    @property
+    def domain(self):
+        return set(DOMAIN_VALUES[self.mask])
+
+    def getName(self):
+        return self.name
+
+    def getValue(self):
+        if not self.isAssigned:
+            return '0'
+        return VALUE_OF[self.digit]
+
+    def getDigit(self):
+        """Returns the integer value of the variable, 0 if unassigned"""
+        if not self.isAssigned:
+            return 0
+        return self.digit
+
+    def getDomain(self):
+        return list(DOMAIN_VALUES[self.mask])
+
+    def getDomainSize(self):
+        return DOMAIN_SIZE[self.mask]
+
+    def getLowestValue(self):
+        """Returns the smallest value in the domain, '0' if the domain is empty"""
+        return VALUE_OF[LOWEST_DIGIT[self.mask]]
+
+    def isInDomain(self, value):
+        return self.mask & BIT_OF[value] != 0
+
+    def assign(self, value):
+        """Assigns value to the variable and returns success/failure"""
+        bit = BIT_OF[value]
+        if not self.mask & bit:
+            print('ERROR! value of the variable not in its domain')
+            return False
+
+        self.digit = DIGIT_OF[value]
+        self.mask ^= bit
+        self.isAssigned = True
+        return True
+
+    def unAssign(self, value):
+        self.digit = 0
+        self.isAssigned = False
+        self.mask |= BIT_OF[value]
+
+    def removeFromDomain(self, value):
+        """Remove a value from the domain. Returns true if the value was in the domain"""
+        bit = BIT_OF[value]
+        if self.mask & bit:
+            self.mask ^= bit
+            return True
+        return False
+
+    def removeValuesFromDomain(self, valuesList):
+        """Remove a set of values from the domain"""
+        for value in valuesList:
+            self.mask &= ~BIT_OF[value]
+
+    def addToDomain(self, value):
+        self.mask |= BIT_OF[value]
+
+    def updateDomain(self, domainValuesList):
+        """Update the domain of the variable with a new list"""
+        self.mask = 0
+        for value in domainValuesList:
+            self.mask |= 1 << (DIGIT_OF[value] - 1)
+        self.digit = 0
+        self.isAssigned = False
+
+    def print(self):
+        print('variable name = ' + self.name)
+        print('domain =', end=' ')
+        print(self.domain)
+        if self.isAssigned:
+            print('assignment = %s' % self.getValue())
+        else:
+            print("unassigned")
+
+class WideBitmaskVariable(BitmaskVariable):
+    """BitmaskVariable for domains larger than 9 digits (16X16 and bigger grids), where the masks are too large
+       for the lookup tables"""
+    __slots__ = ()
+
+    @property
+    def domain(self):
+        return set(self.getDomain())
+
+    def getDomain(self):
+        values = []
+        mask = self.mask
+        while mask:
+            lowest = mask & -mask
+            values.append(VALUE_OF[lowest.bit_length()])
+            mask ^= lowest
+        return values
+
+    def getDomainSize(self):
+        return bin(self.mask).count('1')
+
+    def getLowestValue(self):
+        return VALUE_OF[(self.mask & -self.mask).bit_length()]
+
+
 if __name__ == '__main__':
     var1 = Variable('1', ['1', '2', '3', '4', '5', '6', '7'], '5')
     var1.print()
 
     print(var1.getValue())
 
+    var2 = BitmaskVariable('2', ['1', '2', '3', '4', '5', '6', '7'], '5')
+    var2.print()
+
         